@@ -11,8 +11,15 @@ install_requires = [
     "pandas>=1.4.2,<2.0.0",
     "senkalib @ "
     "git+https://github.com/ca3-caaip/senkalib.git@b4a41ab228f2532707f712eb11ae68da9aa1b378",
+    "eth-utils>=2.0.0,<3.0.0",
+    "hexbytes>=0.3.0,<0.4.0",
 ]
 
+extras_require = {
+    "zstd": ["zstandard>=0.18.0"],
+    "arrow": ["pyarrow>=8.0.0"],
+}
+
 setup_kwargs = {
     "name": "pancake-plugin",
     "version": "0.1.0",
@@ -27,6 +34,7 @@ setup_kwargs = {
     "packages": packages,
     "package_data": package_data,
     "install_requires": install_requires,
+    "extras_require": extras_require,
     "python_requires": ">=3.9,<4.0",
 }
 
@@ -1,44 +1,419 @@
 import argparse
+import json
+import os
+import sys
 
-import pandas as pd
-from senkalib.platform.bsc.bsc_transaction_generator import BscTransactionGenerator
-from senkalib.senka_setting import SenkaSetting
-from senkalib.token_original_id_table import TokenOriginalIdTable
-
+from pancake_plugin.arrow_writer import ARROW_FORMATS, PARTITION_FIELDS, write_dataset
+from pancake_plugin.bscscan_client import (
+    BSCSCAN_MAX_RETRIES,
+    BSCSCAN_PAGE_SIZE,
+    BscScanClient,
+)
+from pancake_plugin.caaj_writer import SORT_WINDOW, SortedCaajWriter
+from pancake_plugin.incremental_sync import SYNC_BATCH_SIZE, SyncCursor, sync_address
+from pancake_plugin.instrumentation import Instrumentation
+from pancake_plugin.multi_address import (
+    ADDRESS_WORKERS,
+    TaggedCaajWriter,
+    interleave_addresses,
+    map_addresses,
+    read_addresses,
+)
 from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.rate_limiter import BSCSCAN_RATE, AdaptiveRateLimiter
+from pancake_plugin.receipt_cache import ReceiptCache
+from pancake_plugin.receipt_fetcher import RECEIPT_WORKERS
+from pancake_plugin.replay_source import iter_replay
+from pancake_plugin.token_table import (
+    TOKEN_TABLE_CACHE_DIR,
+    TOKEN_TABLE_MAX_AGE,
+    MemoizedTokenTable,
+    TokenTableSnapshot,
+)
 
 TOKEN_ORIGINAL_IDS_URL = "https://raw.githubusercontent.com/ca3-caaip/token_original_id/master/token_original_id.csv"
 
 
+def load_token_table(args, client=None, max_age=TOKEN_TABLE_MAX_AGE):
+    snapshot = TokenTableSnapshot(TOKEN_ORIGINAL_IDS_URL, args.token_table_dir, max_age)
+    # tokens the table has no decimals for ask the token contract, once
+    if client is not None:
+        snapshot.decimals_lookups[PancakePlugin.platform] = client.get_token_decimals
+    return snapshot
+
+
+def get_transactions(args, address, cache, startblock=0, seen=None):
+    if args.replay:
+        return iter_replay(args.replay, address, startblock)
+    # one page of txlist at a time, receipts are fetched as the plugin goes.
+    # every address shares args.client and so its rate limit and budget
+    return args.client.get_transactions(
+        address,
+        cache,
+        startblock=startblock,
+        tx_filter=PancakePlugin.can_handle_many,
+        page_size=args.page_size,
+        workers=args.receipt_workers,
+        seen=seen,
+    )
+
+
+def journal_address(args, address, token_table, cache, output_path=None):
+    if args.state_dir:
+        cursor = SyncCursor(args.state_dir)
+        output_path = output_path or args.output
+        startblock = cursor.get_block(output_path, address) + 1
+        return sync_address(
+            address,
+            get_transactions(args, address, cache, startblock),
+            token_table,
+            output_path,
+            cursor,
+            args.batch_size,
+        )
+
+    if output_path is None:
+        return PancakePlugin.journal_many(
+            address,
+            get_transactions(args, address, cache),
+            token_table,
+            args.aggregate_rewards,
+        )
+    caajs = PancakePlugin.iter_caajs_many(
+        address,
+        get_transactions(args, address, cache),
+        token_table,
+        args.aggregate_rewards,
+    )
+    with open(output_path, "w", encoding="utf-8", newline="") as output:
+        writer = SortedCaajWriter(output, window=args.sort_window)
+        for caaj in caajs:
+            writer.write(caaj)
+        writer.close()
+
+
+def serve(args, bscscan_key):
+    # http.server pulls in http.client, only a service run pays for it
+    from pancake_plugin.journal_service import JournalService, make_server
+
+    client = (
+        BscScanClient(
+            bscscan_key,
+            limiter=AdaptiveRateLimiter(args.rate_limit),
+            max_retries=args.max_retries,
+            budget=args.api_budget,
+        )
+        if bscscan_key
+        else None
+    )
+    service = JournalService(
+        load_token_table(args, client),
+        # a reload always asks the server whether the table changed
+        lambda: load_token_table(args, client, max_age=0),
+        client,
+        ReceiptCache(args.cache) if args.cache else None,
+        receipt_workers=args.receipt_workers,
+        page_size=args.page_size,
+    )
+    service.start_reloading(args.token_table_reload)
+    server = make_server(args.serve, service)
+    print(f"serving journals on {args.serve}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PancakeSwap plugin")
     parser.add_argument(
         "address",
         type=str,
-        help="BSC address",
+        nargs="?",
+        help="BSC address, omitted with --addresses",
     )
     parser.add_argument(
         "bscscan_key",
         type=str,
+        nargs="?",
         help="BSCScan API key",
     )
-    address = parser.parse_args().address
-    bscscan_key = parser.parse_args().bscscan_key
-    caajs = []
-    settings = SenkaSetting({"bscscan_key": bscscan_key})
-    token_original_ids = TokenOriginalIdTable(TOKEN_ORIGINAL_IDS_URL)
-    transactions = BscTransactionGenerator.get_transactions(
-        {"settings": settings, "data": address}
+    parser.add_argument(
+        "--replay",
+        type=str,
+        help="journal from an NDJSON receipt dump (.gz/.zst) instead of BSCScan, "
+        "a BSCScan key still looks up token decimals",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=BSCSCAN_PAGE_SIZE,
+        help="transactions requested from BSCScan at a time",
+    )
+    parser.add_argument(
+        "--receipt-workers",
+        type=int,
+        default=RECEIPT_WORKERS,
+        help="transaction receipts requested from BSCScan at the same time",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=BSCSCAN_RATE,
+        help="BSCScan calls per second, lowered while BSCScan rate limits",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=BSCSCAN_MAX_RETRIES,
+        help="retries of a rate limited BSCScan call",
+    )
+    parser.add_argument(
+        "--api-budget",
+        type=int,
+        help="BSCScan calls allowed for the run, retries included",
+    )
+    parser.add_argument(
+        "--sort-window",
+        type=int,
+        default=SORT_WINDOW,
+        help="number of journals sorted in memory before spilling to disk",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        help="SQLite file caching transaction receipts between runs",
+    )
+    parser.add_argument(
+        "--state-dir",
+        type=str,
+        help="directory of per-output block cursors, journals only new blocks",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="CSV file appended by --state-dir runs",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=SYNC_BATCH_SIZE,
+        help="transactions journaled between cursor commits with --state-dir",
+    )
+    parser.add_argument(
+        "--token-table-dir",
+        type=str,
+        default=TOKEN_TABLE_CACHE_DIR,
+        help="directory of the local token table snapshot",
+    )
+    parser.add_argument(
+        "--addresses",
+        type=str,
+        help="file of BSC addresses, one per line, journaled concurrently",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ADDRESS_WORKERS,
+        help="number of addresses journaled at the same time with --addresses",
+    )
+    parser.add_argument(
+        "--related",
+        action="store_true",
+        help="the --addresses wallets trade with each other, journal every "
+        "transaction once for all of them",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="write one CSV per address with --addresses instead of one tagged CSV",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv"] + list(ARROW_FORMATS),
+        default="csv",
+        help="parquet and arrow write a typed dataset into --output-dir",
+    )
+    parser.add_argument(
+        "--partition-by",
+        nargs="*",
+        choices=PARTITION_FIELDS,
+        default=["month"],
+        help="hive partitions of a parquet or arrow dataset",
+    )
+    parser.add_argument(
+        "--aggregate-rewards",
+        action="store_true",
+        help="journal CAKE harvest rewards once per pool per day",
+    )
+    parser.add_argument(
+        "--deterministic-uuid",
+        action="store_true",
+        help="derive trade_uuid from the transaction hash so reruns can be merged",
+    )
+    parser.add_argument(
+        "--serve",
+        type=str,
+        help="keep running as a journaling service on host:port or unix:<path>",
+    )
+    parser.add_argument(
+        "--token-table-reload",
+        type=float,
+        default=TOKEN_TABLE_MAX_AGE,
+        help="seconds between token table reloads of --serve",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        help="file receiving per-branch counters and latencies of the run",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=["json", "prometheus"],
+        default="json",
+        help="format of the --metrics file",
+    )
+    args = parser.parse_args()
+    if args.serve:
+        # the only positional is the BSCScan key, receipts are journaled
+        # without one
+        PancakePlugin.deterministic_uuid = args.deterministic_uuid
+        serve(args, args.bscscan_key or args.address)
+        sys.exit()
+    if args.addresses and args.bscscan_key is None:
+        args.address, args.bscscan_key = None, args.address
+    if (args.bscscan_key is None and not args.replay) or (args.address is None) == (
+        not args.addresses
+    ):
+        parser.error(
+            "give either an address or --addresses, and a BSCScan API key or --replay"
+        )
+    if args.state_dir and args.addresses and not args.output_dir:
+        parser.error("--state-dir with --addresses requires --output-dir")
+    if args.state_dir and not args.addresses and not args.output:
+        parser.error("--state-dir requires --output")
+    if args.state_dir and args.aggregate_rewards:
+        parser.error("--aggregate-rewards cannot be used with --state-dir")
+    if args.related and (
+        not args.addresses or args.state_dir or args.aggregate_rewards
+    ):
+        parser.error(
+            "--related requires --addresses, not --state-dir or --aggregate-rewards"
+        )
+    if args.format != "csv" and (args.state_dir or not args.output_dir):
+        parser.error(f"--format {args.format} requires --output-dir, not --state-dir")
+
+    cache = ReceiptCache(args.cache) if args.cache else None
+    args.client = BscScanClient(
+        args.bscscan_key,
+        limiter=AdaptiveRateLimiter(args.rate_limit),
+        max_retries=args.max_retries,
+        budget=args.api_budget,
+    )
+    # a replay with a BSCScan key looks up decimals as a live run does,
+    # without one it has those the snapshot already holds
+    token_original_ids = MemoizedTokenTable(
+        load_token_table(args, args.client if args.bscscan_key else None)
     )
+    if args.metrics:
+        PancakePlugin.instrumentation = Instrumentation()
+    PancakePlugin.deterministic_uuid = args.deterministic_uuid
 
-    for transaction in transactions:
-        if PancakePlugin.can_handle(transaction):
-            caaj_peace = PancakePlugin.get_caajs(
-                address, transaction, token_original_ids
+    if args.related:
+        addresses = read_addresses(args.addresses)
+        # the wallets are paged through on --workers threads and journaled as
+        # their transactions come, a transaction they share has its receipt
+        # fetched for the first of them only
+        seen: set = set()
+        journals_by_address = PancakePlugin.journal_many_by_address(
+            addresses,
+            interleave_addresses(
+                lambda address: get_transactions(args, address, cache, seen=seen),
+                addresses,
+                args.workers,
+            ),
+            token_original_ids,
+        )
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+        writer = None if args.output_dir else TaggedCaajWriter(sys.stdout)
+        for address, journals in journals_by_address.items():
+            if args.format != "csv":
+                write_dataset(
+                    journals, args.output_dir, args.format, args.partition_by, address
+                )
+            elif writer is None:
+                with open(
+                    os.path.join(args.output_dir, f"{address}.csv"),
+                    "w",
+                    encoding="utf-8",
+                    newline="",
+                ) as output:
+                    journals.write_csv(output)
+            else:
+                writer.write(address, journals)
+    elif args.format != "csv":
+        for address, journals in map_addresses(
+            lambda address: journal_address(args, address, token_original_ids, cache),
+            read_addresses(args.addresses) if args.addresses else [args.address],
+            args.workers,
+        ):
+            write_dataset(
+                journals, args.output_dir, args.format, args.partition_by, address
             )
-            caajs.extend(caaj_peace)
+    elif args.addresses:
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            for _ in map_addresses(
+                lambda address: journal_address(
+                    args,
+                    address,
+                    token_original_ids,
+                    cache,
+                    os.path.join(args.output_dir, f"{address}.csv"),
+                ),
+                read_addresses(args.addresses),
+                args.workers,
+            ):
+                pass
+        else:
+            writer = TaggedCaajWriter(sys.stdout)
+            for address, caajs in map_addresses(
+                lambda address: journal_address(
+                    args, address, token_original_ids, cache
+                ),
+                read_addresses(args.addresses),
+                args.workers,
+            ):
+                writer.write(address, caajs)
+    elif args.state_dir:
+        journal_address(args, args.address, token_original_ids, cache)
+    else:
+        writer = SortedCaajWriter(sys.stdout, window=args.sort_window)
+        for caaj in PancakePlugin.iter_caajs_many(
+            args.address,
+            get_transactions(args, args.address, cache),
+            token_original_ids,
+            args.aggregate_rewards,
+        ):
+            writer.write(caaj)
+        writer.close()
+        print()
 
-    df = pd.DataFrame(caajs)
-    df = df.sort_values("executed_at")
-    caaj_csv = df.to_csv(None, index=False)
-    print(caaj_csv)
+    if not args.replay:
+        print(f"bscscan: {json.dumps(args.client.get_stats())}", file=sys.stderr)
+    if PancakePlugin.instrumentation is not None:
+        instrumentation = PancakePlugin.instrumentation
+        instrumentation.observe_token_lookups(
+            token_original_ids.hits, token_original_ids.misses
+        )
+        if not args.replay:
+            instrumentation.observe_api_calls(args.client.get_stats())
+        with open(args.metrics, "w", encoding="utf-8") as file_metrics:
+            if args.metrics_format == "prometheus":
+                file_metrics.write(instrumentation.to_prometheus())
+            else:
+                file_metrics.write(instrumentation.to_json())
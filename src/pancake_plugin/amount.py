@@ -0,0 +1,25 @@
+from decimal import Decimal
+from functools import lru_cache
+
+DEFAULT_DECIMALS = 18
+# Decimal division keeps 28 significant digits by default
+DECIMAL_PRECISION = 28
+
+
+def decode_uint256(data: str) -> int:
+    return int(data[:66], 16)
+
+
+@lru_cache(maxsize=None)
+def get_scale(decimals: int) -> tuple:
+    scale = 10**decimals
+    return scale, Decimal(scale), 10 ** (DECIMAL_PRECISION + decimals)
+
+
+def format_amount(value: int, decimals: int = DEFAULT_DECIMALS) -> str:
+    scale, decimal_scale, exact_limit = get_scale(decimals)
+    # same text as str(Decimal(value) / Decimal(10**decimals)), without
+    # going through Decimal for whole amounts
+    if value % scale == 0 and value < exact_limit:
+        return str(value // scale)
+    return str(Decimal(value) / decimal_scale)
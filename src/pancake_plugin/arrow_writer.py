@@ -0,0 +1,103 @@
+import decimal
+from typing import Optional
+
+from pancake_plugin.journal_buffer import DictionaryColumn, JournalBuffer
+
+# output format -> (pyarrow dataset format, file extension)
+ARROW_FORMATS = {"parquet": ("parquet", "parquet"), "arrow": ("ipc", "arrow")}
+PARTITION_FIELDS = ["address", "month"]
+# a BEP-20 amount is an uint256 with up to 255 decimals, no decimal type holds
+# all of them. the decimal column holds up to 58 integer and 18 fractional
+# digits, null beyond, and amount_exact keeps the text of every amount
+AMOUNT_PRECISION = 76
+AMOUNT_SCALE = 18
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "parquet and arrow output need pyarrow, install it with "
+            "`pip install pyarrow`"
+        ) from e
+    return pyarrow
+
+
+def to_decimal(amount: str) -> Optional[decimal.Decimal]:
+    value = decimal.Decimal(amount)
+    if (
+        value.as_tuple().exponent < -AMOUNT_SCALE
+        or value.adjusted() >= AMOUNT_PRECISION - AMOUNT_SCALE
+    ):
+        return None
+    return value
+
+
+def to_arrow_table(journals: JournalBuffer, address: Optional[str] = None):
+    pa = import_pyarrow()
+    arrays = {}
+    for name, column in journals.columns.items():
+        if isinstance(column, DictionaryColumn):
+            arrays[name] = pa.DictionaryArray.from_arrays(
+                pa.array(column.codes, type=pa.int32()),
+                pa.array(column.values, type=pa.string()),
+            )
+        elif name == "amount":
+            arrays[name] = pa.array(
+                [to_decimal(amount) for amount in journals.get_column(name)],
+                type=pa.decimal256(AMOUNT_PRECISION, AMOUNT_SCALE),
+            )
+        elif name == "executed_at":
+            arrays[name] = pa.compute.strptime(
+                pa.array(journals.get_column(name), type=pa.string()),
+                format=TIMESTAMP_FORMAT,
+                unit="s",
+            )
+        else:
+            arrays[name] = pa.array(journals.get_column(name), type=pa.string())
+
+    arrays["amount_exact"] = pa.array(journals.get_column("amount"), type=pa.string())
+    if address is not None:
+        arrays["address"] = pa.DictionaryArray.from_arrays(
+            pa.array([0] * len(journals), type=pa.int32()),
+            pa.array([address], type=pa.string()),
+        )
+    return pa.table(arrays)
+
+
+def write_dataset(
+    journals: JournalBuffer,
+    output_dir: str,
+    output_format: str = "parquet",
+    partition_by: Optional[list[str]] = None,
+    address: Optional[str] = None,
+):
+    pa = import_pyarrow()
+    partition_by = list(partition_by or [])
+    if "address" in partition_by and address is None:
+        raise ValueError("partitioning by address needs the address")
+    table = to_arrow_table(journals, address).take(journals.argsort())
+    if "month" in partition_by:
+        table = table.append_column(
+            "month",
+            pa.compute.strftime(
+                table["executed_at"], format="%Y-%m"
+            ).dictionary_encode(),
+        )
+
+    dataset_format, extension = ARROW_FORMATS[output_format]
+    # several addresses share one dataset, name their files apart
+    basename = f"{address or 'part'}-{{i}}.{extension}"
+    pa.dataset.write_dataset(
+        table,
+        output_dir,
+        format=dataset_format,
+        partitioning=partition_by or None,
+        partitioning_flavor="hive" if partition_by else None,
+        basename_template=basename,
+        existing_data_behavior="overwrite_or_ignore",
+    )
@@ -0,0 +1,337 @@
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+from hexbytes import HexBytes
+from senkalib.platform.bsc.bsc_transaction import BscTransaction
+
+from pancake_plugin.rate_limiter import AdaptiveRateLimiter, get_backoff
+from pancake_plugin.receipt_cache import ReceiptCache, to_bsc_transaction, to_record
+from pancake_plugin.receipt_fetcher import ReceiptFetcher
+
+if TYPE_CHECKING:
+    import http.client
+
+BSCSCAN_API_URL = "https://api.bscscan.com/api"
+# bscscan api return 10000 results for each page
+BSCSCAN_PAGE_SIZE = 10000
+# and no result beyond page * offset of 10000
+BSCSCAN_RESULT_WINDOW = 10000
+BSCSCAN_MAX_RETRIES = 5
+# first 4 bytes of keccak("decimals()")
+DECIMALS_SELECTOR = "0x313ce567"
+
+
+class BscScanError(Exception):
+    pass
+
+
+class BscScanClient:
+    def __init__(
+        self,
+        api_key: str,
+        url: str = BSCSCAN_API_URL,
+        timeout: int = 30,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        max_retries: int = BSCSCAN_MAX_RETRIES,
+        budget: Optional[int] = None,
+        backoff: Callable[[int], float] = get_backoff,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.limiter = limiter
+        self.max_retries = max_retries
+        # api calls allowed for the run, retries included
+        self.budget = budget
+        self.backoff = backoff
+        # one keep-alive connection per thread, reused by every request.
+        # all of them are kept to be closed together
+        self.local = threading.local()
+        self.connections: set = set()
+        self.lock = threading.Lock()
+        # query -> future of the request in flight, shared by identical calls
+        self.in_flight: dict[str, Future] = {}
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "coalesced": 0}
+
+    def get_txs(
+        self,
+        address: str,
+        startblock: int = 0,
+        endblock: int = 99999999,
+        page: int = 1,
+        offset: int = BSCSCAN_PAGE_SIZE,
+    ) -> list:
+        response = self._request(
+            {
+                "module": "account",
+                "action": "txlist",
+                "address": address,
+                "startblock": startblock,
+                "endblock": endblock,
+                "page": page,
+                "offset": offset,
+                "sort": "asc",
+            }
+        )
+        if response["status"] == "1":
+            return response["result"]
+        elif response["message"] == "No transactions found":
+            return []
+        raise BscScanError(f"{response['message']}: {response['result']}")
+
+    def get_transaction_receipt(self, tx_hash: str) -> dict:
+        response = self._request(
+            {
+                "module": "proxy",
+                "action": "eth_getTransactionReceipt",
+                "txhash": tx_hash,
+            }
+        )
+        if response.get("result") is None:
+            raise BscScanError(f"receipt is not found: {tx_hash}, {response}")
+        return self.normalize_receipt(response["result"])
+
+    def get_token_decimals(self, token_address: str) -> Optional[int]:
+        response = self._request(
+            {
+                "module": "proxy",
+                "action": "eth_call",
+                "to": token_address,
+                "data": DECIMALS_SELECTOR,
+                "tag": "latest",
+            }
+        )
+        result = response.get("result")
+        # "0x" for a contract without decimals(), an error for no contract
+        if not isinstance(result, str) or not result.startswith("0x") or result == "0x":
+            return None
+        decimals = int(result, 16)
+        # decimals() is an uint8
+        return decimals if decimals < 256 else None
+
+    def iter_tx_pages(
+        self,
+        address: str,
+        startblock: int = 0,
+        page_size: int = BSCSCAN_PAGE_SIZE,
+    ) -> Iterator[list]:
+        # bscscan refuses page * offset beyond 10000, so after a full page the
+        # next request restarts at the last block seen instead of paging on.
+        # that block comes back again and what was already yielded is dropped
+        boundary: set = set()
+        page = 1
+        while True:
+            txs = self.get_txs(
+                address, startblock=startblock, page=page, offset=page_size
+            )
+            new_txs = [tx for tx in txs if tx["hash"] not in boundary]
+            if new_txs:
+                yield new_txs
+            if len(txs) < page_size:
+                return
+
+            last_block = int(txs[-1]["blockNumber"])
+            if last_block != startblock:
+                boundary = {
+                    tx["hash"] for tx in txs if int(tx["blockNumber"]) == last_block
+                }
+                startblock = last_block
+                page = 1
+            else:
+                # a whole page of one block, page through that block
+                boundary.update(tx["hash"] for tx in txs)
+                page += 1
+                if page * page_size > BSCSCAN_RESULT_WINDOW:
+                    raise BscScanError(
+                        f"too many transactions in block {last_block}: {address}"
+                    )
+
+    def get_transactions(
+        self,
+        address: str,
+        cache: Optional[ReceiptCache] = None,
+        startblock: int = 0,
+        tx_filter: Optional[Callable[[list], list]] = None,
+        page_size: int = BSCSCAN_PAGE_SIZE,
+        workers: int = 1,
+        seen: Optional[set] = None,
+    ) -> Iterator[BscTransaction]:
+        # with seen, shared by the wallets of one run, a transaction already
+        # taken by another wallet is skipped before its receipt is fetched
+        with ReceiptFetcher(self.get_transaction_receipt, workers) as fetcher:
+            for txs in self.iter_tx_pages(address, startblock, page_size):
+                if tx_filter is not None:
+                    mask = tx_filter([tx["to"] for tx in txs])
+                else:
+                    mask = [True] * len(txs)
+                txs = [
+                    tx
+                    for tx, handled in zip(txs, mask)
+                    if tx["isError"] != "1" and handled
+                ]
+                if seen is not None:
+                    # wallets on other threads take from the same set
+                    with self.lock:
+                        txs = [tx for tx in txs if tx["hash"].lower() not in seen]
+                        seen.update(tx["hash"].lower() for tx in txs)
+                cached = [cache is not None and tx["hash"] in cache for tx in txs]
+                # receipts missing from the cache are fetched ahead, in order
+                receipts = fetcher.fetch(
+                    tx["hash"] for tx, hit in zip(txs, cached) if not hit
+                )
+                for tx, hit in zip(txs, cached):
+                    if hit:
+                        record = cache.get(tx["hash"])
+                    else:
+                        record = to_record(tx, next(receipts))
+                        if cache is not None:
+                            cache.put(record)
+                    yield to_bsc_transaction(record)
+
+    @classmethod
+    def normalize_receipt(cls, receipt: dict) -> dict:
+        # imported on first use, eth_utils and http.client take longer to
+        # import than a replayed wallet takes to journal
+        from eth_utils import to_checksum_address
+
+        # same shape as web3's get_transaction_receipt
+        return {
+            **receipt,
+            "blockNumber": int(receipt["blockNumber"], 16),
+            "status": int(receipt["status"], 16),
+            "from": to_checksum_address(receipt["from"]),
+            "to": to_checksum_address(receipt["to"]) if receipt["to"] else None,
+            "logs": [
+                {
+                    **log,
+                    "address": to_checksum_address(log["address"]),
+                    "topics": [HexBytes(topic) for topic in log["topics"]],
+                    "logIndex": int(log["logIndex"], 16),
+                }
+                for log in receipt["logs"]
+            ],
+        }
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats["budget"] = self.budget
+        if self.budget is not None:
+            stats["budget_left"] = self.budget - stats["calls"]
+        if self.limiter is not None:
+            stats["rate"] = self.limiter.rate
+        return stats
+
+    @classmethod
+    def is_rate_limited(cls, status: int, response: Optional[dict]) -> bool:
+        # bscscan answers a rate limited call with 200 and a NOTOK result
+        if status == 429:
+            return True
+        result = response.get("result") if isinstance(response, dict) else None
+        return isinstance(result, str) and "rate limit" in result.lower()
+
+    def _request(self, params: dict) -> dict:
+        query = urllib.parse.urlencode({**params, "apikey": self.api_key})
+        with self.lock:
+            future = self.in_flight.get(query)
+            coalesced = future is not None
+            if coalesced:
+                self.stats["coalesced"] += 1
+            else:
+                future = self.in_flight[query] = Future()
+        if coalesced:
+            return future.result()
+
+        try:
+            response = self.__request_with_retry(query)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self.lock:
+                del self.in_flight[query]
+
+    def __request_with_retry(self, query: str) -> dict:
+        for attempt in range(self.max_retries + 1):
+            with self.lock:
+                if self.budget is not None and self.stats["calls"] >= self.budget:
+                    raise BscScanError(f"api call budget of {self.budget} is spent")
+                self.stats["calls"] += 1
+                if attempt > 0:
+                    self.stats["retries"] += 1
+            epoch = None
+            if self.limiter is not None:
+                epoch = self.limiter.acquire()
+
+            status, body = self.__send(query)
+            response = json.loads(body) if status == 200 else None
+            if not self.is_rate_limited(status, response):
+                if status != 200:
+                    raise BscScanError(f"HTTP {status}: {body[:200]!r}")
+                if self.limiter is not None:
+                    self.limiter.recover()
+                return response
+
+            with self.lock:
+                self.stats["rate_limited"] += 1
+            if self.limiter is not None:
+                self.limiter.throttle(epoch)
+            if attempt < self.max_retries:
+                time.sleep(self.backoff(attempt))
+        raise BscScanError(f"rate limited after {self.max_retries} retries")
+
+    def __send(self, query: str) -> tuple[int, bytes]:
+        import http.client
+
+        path = f"{urllib.parse.urlsplit(self.url).path or '/'}?{query}"
+        for retry in (False, True):
+            connection = self.__get_connection()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # the server may close an idle keep-alive connection
+                connection.close()
+                self.local.connection = None
+                with self.lock:
+                    self.connections.discard(connection)
+                if retry:
+                    raise
+
+    def close(self):
+        # the connections of every thread that made a request
+        with self.lock:
+            connections = list(self.connections)
+            self.connections.clear()
+        for connection in connections:
+            connection.close()
+        self.local.connection = None
+
+    def __get_connection(self) -> "http.client.HTTPConnection":
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            import http.client
+
+            url = urllib.parse.urlsplit(self.url)
+            if url.scheme == "https":
+                connection = http.client.HTTPSConnection(
+                    url.netloc, timeout=self.timeout
+                )
+            else:
+                connection = http.client.HTTPConnection(
+                    url.netloc, timeout=self.timeout
+                )
+            self.local.connection = connection
+        if connection not in self.connections:
+            # new, or closed by close() and reopened by its next request
+            with self.lock:
+                self.connections.add(connection)
+        return connection
@@ -0,0 +1,89 @@
+import csv
+import dataclasses
+import heapq
+import tempfile
+from typing import IO, Iterator, Optional
+
+from senkalib.caaj_journal import CaajJournal
+
+SORT_WINDOW = 100000
+CAAJ_FIELDNAMES = [field.name for field in dataclasses.fields(CaajJournal)]
+
+
+def to_row(caaj: CaajJournal) -> list:
+    row = []
+    for name in CAAJ_FIELDNAMES:
+        value = getattr(caaj, name)
+        row.append("" if value is None else str(value))
+    return row
+
+
+class SortedCaajWriter:
+    def __init__(
+        self,
+        stream: IO[str],
+        key: str = "executed_at",
+        window: int = SORT_WINDOW,
+        tmpdir: Optional[str] = None,
+    ):
+        self.stream = stream
+        self.fieldnames = CAAJ_FIELDNAMES
+        self.key_position = self.fieldnames.index(key)
+        self.window = max(window, 1)
+        self.tmpdir = tmpdir
+        self.heap: list = []
+        self.runs: list = []
+        self.run_writer = None
+        self.run_last_key = None
+        self.sequence = 0
+
+    def write(self, caaj: CaajJournal):
+        row = to_row(caaj)
+        key = row[self.key_position]
+        # replacement selection: a row that sorts before what the current run
+        # already spilled has to wait for the next run
+        run = max(len(self.runs) - 1, 0)
+        if self.run_last_key is not None and key < self.run_last_key:
+            run += 1
+        heapq.heappush(self.heap, (run, key, self.sequence, row))
+        self.sequence += 1
+        if len(self.heap) > self.window:
+            self.__spill_one()
+
+    def close(self):
+        writer = csv.writer(self.stream, lineterminator="\n")
+        writer.writerow(self.fieldnames)
+        if not self.runs:
+            while self.heap:
+                writer.writerow(heapq.heappop(self.heap)[3])
+            return
+
+        while self.heap:
+            self.__spill_one()
+        if len(self.runs) == 1:
+            for _, _, row in self.__read_run(self.runs[0]):
+                writer.writerow(row)
+        else:
+            for _, _, row in heapq.merge(*map(self.__read_run, self.runs)):
+                writer.writerow(row)
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+    def __spill_one(self):
+        run, key, sequence, row = heapq.heappop(self.heap)
+        if run >= len(self.runs):
+            self.runs.append(
+                tempfile.TemporaryFile(
+                    "w+", newline="", encoding="utf-8", dir=self.tmpdir
+                )
+            )
+            self.run_writer = csv.writer(self.runs[-1], lineterminator="\n")
+        self.run_writer.writerow([sequence] + row)
+        self.run_last_key = key
+
+    def __read_run(self, run: IO[str]) -> Iterator[tuple]:
+        run.seek(0)
+        for record in csv.reader(run):
+            row = record[1:]
+            yield row[self.key_position], int(record[0]), row
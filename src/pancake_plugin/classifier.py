@@ -0,0 +1,55 @@
+from typing import Iterable, Optional
+
+
+class EventClassifier:
+    def __init__(self, rules: Iterable[tuple]):
+        # rules are (contract, required topics, branch) as raw bytes, the
+        # first match wins. every subset of the topics a contract cares
+        # about is compiled into one (contract, topic bitmask) -> branch
+        # entry, so a receipt is classified with a single dict lookup
+        # however many rules there are
+        rules = [
+            (contract, tuple(topics), branch) for contract, topics, branch in rules
+        ]
+        self.topic_bits: dict[bytes, int] = {}
+        for _, topics, _ in rules:
+            for topic in topics:
+                self.topic_bits.setdefault(topic, 1 << len(self.topic_bits))
+
+        self.contract_masks: dict[bytes, int] = {}
+        for contract, topics, _ in rules:
+            self.contract_masks[contract] = self.contract_masks.get(
+                contract, 0
+            ) | self.get_mask(topics)
+
+        self.table: dict[tuple[bytes, int], str] = {}
+        for contract, contract_mask in self.contract_masks.items():
+            for mask in self.__get_submasks(contract_mask):
+                for rule_contract, topics, branch in rules:
+                    required = self.get_mask(topics)
+                    if rule_contract == contract and mask & required == required:
+                        self.table[(contract, mask)] = branch
+                        break
+
+    def get_mask(self, topics: Iterable[bytes]) -> int:
+        # one lookup per topic of the receipt, whatever the rules
+        mask = 0
+        for topic in topics:
+            mask |= self.topic_bits.get(topic, 0)
+        return mask
+
+    def classify(self, contract: bytes, topics: Iterable[bytes]) -> Optional[str]:
+        contract_mask = self.contract_masks.get(contract)
+        if contract_mask is None:
+            return None
+        return self.table.get((contract, self.get_mask(topics) & contract_mask))
+
+    @classmethod
+    def __get_submasks(cls, mask: int) -> list[int]:
+        submasks = []
+        submask = mask
+        while True:
+            submasks.append(submask)
+            if submask == 0:
+                return submasks
+            submask = (submask - 1) & mask
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from senkalib.platform.bsc.bsc_transaction import BscTransaction
+
+from pancake_plugin.caaj_writer import CAAJ_FIELDNAMES, to_row
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.token_table import MemoizedTokenTable
+
+if TYPE_CHECKING:
+    from senkalib.token_original_id_table import TokenOriginalIdTable
+
+SYNC_BATCH_SIZE = 1000
+
+
+class SyncCursor:
+    # one cursor per output file: where its committed rows end and the last
+    # block journaled for every address written into it
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def get_path(self, output_path: str) -> str:
+        output_path = os.path.abspath(output_path)
+        digest = hashlib.sha1(output_path.encode()).hexdigest()[:16]
+        return os.path.join(
+            self.state_dir, f"{os.path.basename(output_path)}.{digest}.json"
+        )
+
+    def load(self, output_path: str) -> Optional[dict]:
+        try:
+            with open(self.get_path(output_path), "r", encoding="utf-8") as file_cursor:
+                return json.load(file_cursor)
+        except FileNotFoundError:
+            return None
+
+    def get_block(self, output_path: str, address: str) -> int:
+        state = self.load(output_path)
+        if state is None:
+            return -1
+        return state["blocks"].get(address.lower(), -1)
+
+    def commit(self, output_path: str, address: str, block: int, offset: int):
+        state = self.load(output_path) or {"blocks": {}}
+        state["blocks"][address.lower()] = block
+        state["offset"] = offset
+        path = self.get_path(output_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_cursor:
+            json.dump(state, file_cursor)
+            file_cursor.flush()
+            os.fsync(file_cursor.fileno())
+        os.replace(tmp_path, path)
+
+
+def sync_address(
+    address: str,
+    transactions: Iterable[BscTransaction],
+    token_table: TokenOriginalIdTable,
+    output_path: str,
+    cursor: SyncCursor,
+    batch_size: int = SYNC_BATCH_SIZE,
+) -> int:
+    if os.path.exists(output_path):
+        output_size = os.path.getsize(output_path)
+    else:
+        output_size = 0
+    state = cursor.load(output_path)
+    if state is None:
+        if output_size > 0:
+            raise ValueError(
+                f"output was not written with this state dir, not truncating it: "
+                f"{output_path}"
+            )
+        # claim the output before writing, so a run killed before its first
+        # commit is resumed instead of refused
+        cursor.commit(output_path, address, -1, 0)
+        state = cursor.load(output_path)
+    if output_size < state["offset"]:
+        raise ValueError(f"output is shorter than its sync cursor: {output_path}")
+    last_block = state["blocks"].get(address.lower(), -1)
+    if not isinstance(token_table, MemoizedTokenTable):
+        token_table = MemoizedTokenTable(token_table)
+    journaled = 0
+
+    with open(output_path, "a+", encoding="utf-8", newline="") as output:
+        # drop whatever a killed run appended after the last committed batch
+        output.truncate(state["offset"])
+        output.seek(state["offset"])
+        writer = csv.writer(output, lineterminator="\n")
+        if state["offset"] == 0:
+            writer.writerow(CAAJ_FIELDNAMES)
+
+        caajs: list = []
+        batch_block = last_block
+        batch_count = 0
+        for transaction in transactions:
+            block = transaction.transaction_receipt["blockNumber"]
+            if block <= last_block:
+                continue
+            if block != batch_block and batch_count >= batch_size:
+                journaled += _commit_batch(
+                    address, caajs, writer, output, cursor, batch_block
+                )
+                caajs = []
+                batch_count = 0
+            batch_block = block
+            batch_count += 1
+            if PancakePlugin.can_handle(transaction):
+                caajs.extend(PancakePlugin.get_caajs(address, transaction, token_table))
+
+        if batch_count > 0:
+            journaled += _commit_batch(
+                address, caajs, writer, output, cursor, batch_block
+            )
+        elif state["offset"] == 0:
+            _commit_batch(address, caajs, writer, output, cursor, batch_block)
+    return journaled
+
+
+def _commit_batch(address, caajs, writer, output, cursor, block) -> int:
+    caajs.sort(key=lambda caaj: caaj.executed_at)
+    for caaj in caajs:
+        writer.writerow(to_row(caaj))
+    output.flush()
+    os.fsync(output.fileno())
+    cursor.commit(output.name, address, block, output.tell())
+    return len(caajs)
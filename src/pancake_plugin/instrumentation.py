@@ -0,0 +1,153 @@
+import bisect
+import heapq
+import json
+import threading
+
+LATENCY_BUCKETS = [
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+]
+SLOW_TRANSACTION_SECONDS = 0.01
+SLOW_TRANSACTION_SAMPLES = 100
+METRIC_PREFIX = "pancake_plugin"
+
+
+class Histogram:
+    def __init__(self, buckets: list = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bucket, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bucket)] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class Instrumentation:
+    def __init__(
+        self,
+        slow_seconds: float = SLOW_TRANSACTION_SECONDS,
+        slow_samples: int = SLOW_TRANSACTION_SAMPLES,
+    ):
+        self.slow_seconds = slow_seconds
+        self.slow_samples = slow_samples
+        self.lock = threading.Lock()
+        self.branches: dict[str, int] = {}
+        self.latencies: dict[str, Histogram] = {}
+        self.slow_transactions: list = []
+        self.token_lookups = {"hit": 0, "miss": 0}
+        self.api_calls: dict[str, int] = {}
+
+    def observe(self, branch: str, seconds: float, transaction_id: str):
+        with self.lock:
+            self.branches[branch] = self.branches.get(branch, 0) + 1
+            if branch not in self.latencies:
+                self.latencies[branch] = Histogram()
+            self.latencies[branch].observe(seconds)
+            if seconds >= self.slow_seconds:
+                # keep the slowest samples only
+                sample = (seconds, transaction_id, branch)
+                if len(self.slow_transactions) < self.slow_samples:
+                    heapq.heappush(self.slow_transactions, sample)
+                else:
+                    heapq.heappushpop(self.slow_transactions, sample)
+
+    def observe_token_lookups(self, hits: int, misses: int):
+        with self.lock:
+            self.token_lookups = {"hit": hits, "miss": misses}
+
+    def observe_api_calls(self, stats: dict):
+        with self.lock:
+            self.api_calls = {
+                name: stats[name]
+                for name in ["calls", "retries", "rate_limited", "coalesced"]
+            }
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "branches": dict(self.branches),
+                "latency_seconds": {
+                    branch: histogram.to_dict()
+                    for branch, histogram in self.latencies.items()
+                },
+                "token_lookups": dict(self.token_lookups),
+                "api_calls": dict(self.api_calls),
+                "slow_transactions": [
+                    {
+                        "transaction_id": transaction_id,
+                        "branch": branch,
+                        "seconds": seconds,
+                    }
+                    for seconds, transaction_id, branch in sorted(
+                        self.slow_transactions, reverse=True
+                    )
+                ],
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        metrics = self.to_dict()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_transactions_total transactions journaled per get_caajs branch",
+            f"# TYPE {METRIC_PREFIX}_transactions_total counter",
+        ]
+        for branch, count in metrics["branches"].items():
+            lines.append(
+                f'{METRIC_PREFIX}_transactions_total{{branch="{branch}"}} {count}'
+            )
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_get_caajs_seconds get_caajs latency per branch",
+            f"# TYPE {METRIC_PREFIX}_get_caajs_seconds histogram",
+        ]
+        for branch, histogram in metrics["latency_seconds"].items():
+            for bucket, count in histogram["buckets"].items():
+                lines.append(
+                    f'{METRIC_PREFIX}_get_caajs_seconds_bucket{{branch="{branch}",le="{bucket}"}} {count}'
+                )
+            lines.append(
+                f'{METRIC_PREFIX}_get_caajs_seconds_sum{{branch="{branch}"}} {histogram["sum"]}'
+            )
+            lines.append(
+                f'{METRIC_PREFIX}_get_caajs_seconds_count{{branch="{branch}"}} {histogram["count"]}'
+            )
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_token_lookups_total token table lookups by cache result",
+            f"# TYPE {METRIC_PREFIX}_token_lookups_total counter",
+        ]
+        for result, count in metrics["token_lookups"].items():
+            lines.append(
+                f'{METRIC_PREFIX}_token_lookups_total{{result="{result}"}} {count}'
+            )
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_api_calls_total BSCScan calls by outcome",
+            f"# TYPE {METRIC_PREFIX}_api_calls_total counter",
+        ]
+        for kind, count in metrics["api_calls"].items():
+            lines.append(f'{METRIC_PREFIX}_api_calls_total{{kind="{kind}"}} {count}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,223 @@
+import array
+import csv
+import uuid
+from typing import IO, Iterable, Iterator, Optional, Sequence
+
+from senkalib.caaj_journal import CaajJournal
+
+from pancake_plugin.caaj_writer import CAAJ_FIELDNAMES
+
+# fields with a handful of distinct values are stored as codes into a
+# dictionary, the others as one utf-8 buffer per column
+DICTIONARY_FIELDS = frozenset(
+    [
+        "platform",
+        "application",
+        "service",
+        "type",
+        "uti",
+        "caaj_from",
+        "caaj_to",
+        "comment",
+    ]
+)
+# fields repeated by every journal of a transaction
+TRANSACTION_FIELDS = frozenset(["executed_at", "transaction_id", "trade_uuid"])
+INTEGER_TYPECODES = ["B", "H", "I", "Q"]
+
+
+# transaction hashes and uuids are kept as their raw bytes behind a 1 byte
+# tag, anything else as its text behind a 0
+def encode_hex(value: str) -> bytes:
+    if value.startswith("0x") and len(value) % 2 == 0:
+        try:
+            raw = bytes.fromhex(value[2:])
+        except ValueError:
+            raw = None
+        if raw is not None and "0x" + raw.hex() == value:
+            return b"\x01" + raw
+    return b"\x00" + value.encode()
+
+
+def decode_hex(data: bytes) -> str:
+    return "0x" + data[1:].hex() if data[0] else data[1:].decode()
+
+
+def encode_uuid(value: str) -> bytes:
+    try:
+        raw = uuid.UUID(value)
+    except ValueError:
+        raw = None
+    if raw is not None and str(raw) == value:
+        return b"\x01" + raw.bytes
+    return b"\x00" + value.encode()
+
+
+def decode_uuid(data: bytes) -> str:
+    return str(uuid.UUID(bytes=bytes(data[1:]))) if data[0] else data[1:].decode()
+
+
+CODECS = {
+    "transaction_id": (encode_hex, decode_hex),
+    "trade_uuid": (encode_uuid, decode_uuid),
+}
+
+
+def widen(values: array.array, value: int) -> array.array:
+    # integer arrays start one byte wide and grow with the largest value
+    typecode = values.typecode
+    while value >= 1 << (8 * array.array(typecode).itemsize):
+        typecode = INTEGER_TYPECODES[INTEGER_TYPECODES.index(typecode) + 1]
+    return array.array(typecode, values)
+
+
+class DictionaryColumn:
+    __slots__ = ("codes", "values", "index")
+
+    def __init__(self):
+        self.codes = array.array("B")
+        self.values: list[Optional[str]] = []
+        self.index: dict[Optional[str], int] = {}
+
+    def append(self, value: Optional[str]):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.index[value] = code
+            if code >> (8 * self.codes.itemsize):
+                self.codes = widen(self.codes, code)
+        self.codes.append(code)
+
+    def __getitem__(self, position: int) -> Optional[str]:
+        return self.values[self.codes[position]]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class PackedColumn:
+    # with deduplicate, a value equal to the previous one such as the
+    # transaction id shared by the rows of one transaction is stored once
+    __slots__ = ("data", "offsets", "codes", "last", "length", "codec")
+
+    def __init__(self, deduplicate: bool = False, codec: Optional[tuple] = None):
+        self.data = bytearray()
+        self.offsets = array.array("B", [0])
+        self.codes = array.array("B") if deduplicate else None
+        self.last: Optional[str] = None
+        self.length = 0
+        # (encode, decode) of the values, utf-8 without one
+        self.codec = codec
+
+    def append(self, value: str):
+        if self.codes is None or value != self.last or not self.length:
+            if self.codec is None:
+                self.data += value.encode()
+            else:
+                self.data += self.codec[0](value)
+            if len(self.data) >> (8 * self.offsets.itemsize):
+                self.offsets = widen(self.offsets, len(self.data))
+            self.offsets.append(len(self.data))
+            self.last = value
+        if self.codes is not None:
+            code = len(self.offsets) - 2
+            if code >> (8 * self.codes.itemsize):
+                self.codes = widen(self.codes, code)
+            self.codes.append(code)
+        self.length += 1
+
+    def __getitem__(self, position: int) -> str:
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("column index out of range")
+        code = position if self.codes is None else self.codes[position]
+        data = self.data[self.offsets[code] : self.offsets[code + 1]]
+        return data.decode() if self.codec is None else self.codec[1](data)
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class JournalBuffer:
+    __slots__ = ("columns",)
+
+    def __init__(self, caajs: Iterable[CaajJournal] = ()):
+        self.columns = {
+            name: DictionaryColumn()
+            if name in DICTIONARY_FIELDS
+            else PackedColumn(name in TRANSACTION_FIELDS, CODECS.get(name))
+            for name in CAAJ_FIELDNAMES
+        }
+        self.extend(caajs)
+
+    def append(self, caaj: CaajJournal):
+        for name, column in self.columns.items():
+            value = getattr(caaj, name)
+            column.append(value if value is None else str(value))
+
+    def append_row(self, row: Sequence[Optional[str]]):
+        # the fields of a journal in CAAJ_FIELDNAMES order, as text
+        for column, value in zip(self.columns.values(), row):
+            column.append(value)
+
+    def extend(self, caajs: Iterable[CaajJournal]):
+        for caaj in caajs:
+            self.append(caaj)
+
+    def __len__(self) -> int:
+        return len(self.columns["executed_at"])
+
+    def get_row(self, position: int) -> list:
+        return [column[position] for column in self.columns.values()]
+
+    def get_column(self, name: str) -> list:
+        column = self.columns[name]
+        return [column[position] for position in range(len(column))]
+
+    def argsort(self, key: str = "executed_at") -> list[int]:
+        # stable, rows of one transaction keep their order
+        column = self.columns[key]
+        return sorted(range(len(self)), key=column.__getitem__)
+
+    def iter_rows(self, positions: Optional[Iterable[int]] = None) -> Iterator[list]:
+        if positions is None:
+            positions = range(len(self))
+        for position in positions:
+            yield self.get_row(position)
+
+    def iter_caajs(
+        self, positions: Optional[Iterable[int]] = None
+    ) -> Iterator[CaajJournal]:
+        for row in self.iter_rows(positions):
+            yield CaajJournal(*row)
+
+    def write_csv(self, stream: IO[str], key: Optional[str] = "executed_at"):
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(CAAJ_FIELDNAMES)
+        positions = self.argsort(key) if key is not None else None
+        for row in self.iter_rows(positions):
+            writer.writerow(["" if value is None else value for value in row])
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        data = {}
+        for name, column in self.columns.items():
+            if isinstance(column, DictionaryColumn):
+                codes, values = column.codes, column.values
+                if None in column.index:
+                    # pandas codes a missing value as -1, not as a category
+                    missing = column.index[None]
+                    codes = [
+                        -1 if code == missing else code - (code > missing)
+                        for code in codes
+                    ]
+                    values = values[:missing] + values[missing + 1 :]
+                data[name] = pd.Categorical.from_codes(
+                    codes, pd.Index(values, dtype=object)
+                )
+            else:
+                data[name] = self.get_column(name)
+        return pd.DataFrame(data, columns=CAAJ_FIELDNAMES)
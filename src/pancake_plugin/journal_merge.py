@@ -0,0 +1,42 @@
+import csv
+from typing import Iterable, Iterator
+
+from senkalib.caaj_journal import CaajJournal
+
+from pancake_plugin.caaj_writer import CAAJ_FIELDNAMES
+
+
+def read_caajs(path: str) -> Iterator[CaajJournal]:
+    with open(path, "r", encoding="utf-8", newline="") as file_caajs:
+        for row in csv.DictReader(file_caajs):
+            yield CaajJournal(*[row[name] for name in CAAJ_FIELDNAMES])
+
+
+def get_wallet(caaj: CaajJournal) -> str:
+    # the journaled wallet receives what it gets or withdraws and sends the
+    # rest, fees included
+    wallet = caaj.caaj_to if caaj.type in ("get", "withdraw") else caaj.caaj_from
+    return wallet.lower()
+
+
+def get_key(caaj: CaajJournal) -> tuple:
+    # wallets journaling one transaction share a trade_uuid, the wallet
+    # tells their journals apart
+    return (caaj.trade_uuid, get_wallet(caaj))
+
+
+def merge_caajs(*sources: Iterable[CaajJournal]) -> list[CaajJournal]:
+    # later sources win: the journals of a key all come from the last source
+    # holding it, so a rerun replaces a wallet's journals of a transaction
+    # wholesale, even when its legs changed.
+    # needs the trade_uuid of PancakePlugin.deterministic_uuid
+    merged: dict[tuple, list[CaajJournal]] = {}
+    for source in sources:
+        replaced = set()
+        for caaj in source:
+            key = get_key(caaj)
+            if key not in replaced:
+                replaced.add(key)
+                merged[key] = []
+            merged[key].append(caaj)
+    return [caaj for caajs in merged.values() for caaj in caajs]
@@ -0,0 +1,257 @@
+import csv
+import io
+import json
+import socketserver
+import threading
+import time
+import traceback
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Iterator, Optional
+
+from pancake_plugin.bscscan_client import BSCSCAN_PAGE_SIZE, BscScanClient, BscScanError
+from pancake_plugin.caaj_writer import CAAJ_FIELDNAMES, to_row
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.receipt_cache import ReceiptCache, to_bsc_transaction
+from pancake_plugin.replay_source import parse_record
+from pancake_plugin.token_table import TOKEN_TABLE_MAX_AGE, MemoizedTokenTable
+
+# csv bytes buffered before a chunk of the response is sent
+STREAM_CHUNK_SIZE = 16384
+# receipts kept by the in-memory cache of a service run without --cache
+SERVICE_CACHE_RECEIPTS = 100000
+
+
+class JournalService:
+    def __init__(
+        self,
+        token_table,
+        load_token_table: Optional[Callable[[], object]] = None,
+        client: Optional[BscScanClient] = None,
+        cache: Optional[ReceiptCache] = None,
+        receipt_workers: int = 1,
+        page_size: int = BSCSCAN_PAGE_SIZE,
+    ):
+        # a request journals with the token table it started with, a reload
+        # swaps in a new one without holding up the requests in flight
+        self.token_table = MemoizedTokenTable(token_table)
+        self.token_table_loaded_at = time.time()
+        self.load_token_table = load_token_table
+        self.client = client
+        self.receipt_workers = receipt_workers
+        self.page_size = page_size
+        # receipts stay cached across requests, in bounded memory unless a
+        # file is given
+        self.cache = (
+            cache
+            if cache is not None
+            else ReceiptCache(":memory:", max_receipts=SERVICE_CACHE_RECEIPTS)
+        )
+        self.reload_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.requests = 0
+        self.requests_lock = threading.Lock()
+
+    def reload_token_table(self) -> bool:
+        if self.load_token_table is None:
+            return False
+        with self.reload_lock:
+            token_table = MemoizedTokenTable(self.load_token_table())
+            self.token_table = token_table
+            self.token_table_loaded_at = time.time()
+        return True
+
+    def start_reloading(self, interval: float = TOKEN_TABLE_MAX_AGE):
+        def reload_forever():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.reload_token_table()
+                except Exception:
+                    # keep serving with the table already loaded
+                    pass
+
+        thread = threading.Thread(target=reload_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
+
+    def journal_address(
+        self, address: str, startblock: int = 0, aggregate_rewards: bool = False
+    ) -> Iterator:
+        if self.client is None:
+            raise ValueError("the service runs without a BSCScan API key")
+        self.count_request()
+        return PancakePlugin.iter_caajs_many(
+            address,
+            self.client.get_transactions(
+                address,
+                self.cache,
+                startblock=startblock,
+                page_size=self.page_size,
+                workers=self.receipt_workers,
+                tx_filter=PancakePlugin.can_handle_many,
+            ),
+            self.token_table,
+            aggregate_rewards,
+        )
+
+    def journal_receipts(
+        self, lines: Iterable[bytes], aggregate_rewards: bool = False
+    ) -> Iterator:
+        # lines of a replay dump, journaled from the transaction sender
+        self.count_request()
+        return PancakePlugin.iter_caajs_many(
+            None,
+            (to_bsc_transaction(parse_record(line)) for line in lines if line.strip()),
+            self.token_table,
+            aggregate_rewards,
+        )
+
+    def count_request(self):
+        # handler threads count concurrently
+        with self.requests_lock:
+            self.requests += 1
+
+    def get_status(self) -> dict:
+        token_table = self.token_table
+        status = {
+            "requests": self.requests,
+            "token_table_loaded_at": self.token_table_loaded_at,
+            "token_lookups": {"hit": token_table.hits, "miss": token_table.misses},
+        }
+        if self.client is not None:
+            status["bscscan"] = self.client.get_stats()
+        return status
+
+
+class JournalRequestHandler(BaseHTTPRequestHandler):
+    # GET  /journals/<address>?startblock=&aggregate_rewards=
+    # POST /journals           NDJSON receipts as in a replay dump
+    # POST /token-table/reload
+    # GET  /status
+    protocol_version = "HTTP/1.1"
+    server: "JournalServer"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/status":
+            self.send_json(200, self.server.service.get_status())
+        elif url.path.startswith("/journals/"):
+            self.send_journals(
+                lambda: self.server.service.journal_address(
+                    url.path[len("/journals/") :],
+                    int(params.get("startblock", 0)),
+                    params.get("aggregate_rewards") == "1",
+                )
+            )
+        else:
+            self.send_json(404, {"error": f"not found: {url.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path == "/journals":
+            self.send_journals(
+                lambda: self.server.service.journal_receipts(
+                    body.splitlines(), params.get("aggregate_rewards") == "1"
+                )
+            )
+        elif url.path == "/token-table/reload":
+            try:
+                reloaded = self.server.service.reload_token_table()
+            except Exception as e:
+                self.send_json(502, {"error": str(e)})
+                return
+            self.send_json(200, {"reloaded": reloaded})
+        else:
+            self.send_json(404, {"error": f"not found: {url.path}"})
+
+    def send_journals(self, journal: Callable[[], Iterator]):
+        # the first journal is produced before the headers, so a bad address
+        # or a BSCScan failure still gets an error status
+        try:
+            caajs = journal()
+            first = next(caajs, None)
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except BscScanError as e:
+            self.send_json(502, {"error": str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(CAAJ_FIELDNAMES)
+        try:
+            if first is not None:
+                writer.writerow(to_row(first))
+            for caaj in caajs:
+                writer.writerow(to_row(caaj))
+                if buffer.tell() >= STREAM_CHUNK_SIZE:
+                    self.send_chunk(buffer)
+            self.send_chunk(buffer)
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception:
+            # the status is already sent, a cut off stream tells the client
+            # and the log tells why
+            self.log_error(
+                "journal stream of %s cut off\n%s", self.path, traceback.format_exc()
+            )
+            self.close_connection = True
+
+    def send_chunk(self, buffer: io.StringIO):
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def send_json(self, status: int, response: dict):
+        body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # a unix socket peer has no address, log_error still needs one
+        if not self.client_address:
+            return "unix"
+        return super().address_string()
+
+    def log_request(self, code="-", size="-"):
+        # no access log, errors still go to stderr
+        pass
+
+
+class JournalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, service: JournalService):
+        self.service = service
+        super().__init__(address, JournalRequestHandler)
+
+
+class UnixJournalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service: JournalService):
+        self.service = service
+        super().__init__(path, JournalRequestHandler)
+
+
+def make_server(listen: str, service: JournalService):
+    # host:port, or unix:<path> for a unix socket
+    if listen.startswith("unix:"):
+        return UnixJournalServer(listen[len("unix:") :], service)
+    host, _, port = listen.rpartition(":")
+    return JournalServer((host or "127.0.0.1", int(port)), service)
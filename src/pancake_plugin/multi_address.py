@@ -0,0 +1,110 @@
+import collections
+import csv
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Callable, Iterable, Iterator
+
+from pancake_plugin.caaj_writer import CAAJ_FIELDNAMES
+from pancake_plugin.journal_buffer import JournalBuffer
+
+ADDRESS_WORKERS = 4
+# items read ahead of the consumer by interleave_addresses
+ADDRESS_QUEUE_SIZE = 1000
+
+
+def read_addresses(path: str) -> list[str]:
+    addresses = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as file_addresses:
+        for line in file_addresses:
+            address = line.split("#", 1)[0].strip()
+            if address and address.lower() not in seen:
+                seen.add(address.lower())
+                addresses.append(address)
+    return addresses
+
+
+def map_addresses(
+    journal: Callable[[str], object],
+    addresses: Iterable[str],
+    workers: int = ADDRESS_WORKERS,
+) -> Iterator[tuple]:
+    # results come back in input order, with at most 2 * workers addresses
+    # in flight so finished journals do not pile up behind a slow wallet
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: collections.deque = collections.deque()
+        for address in addresses:
+            pending.append((address, executor.submit(journal, address)))
+            if len(pending) >= workers * 2:
+                address, future = pending.popleft()
+                yield address, future.result()
+        while pending:
+            address, future = pending.popleft()
+            yield address, future.result()
+
+
+def interleave_addresses(
+    iterate: Callable[[str], Iterable],
+    addresses: Iterable[str],
+    workers: int = ADDRESS_WORKERS,
+    queue_size: int = ADDRESS_QUEUE_SIZE,
+) -> Iterator:
+    # the items of every address as they come, from at most workers addresses
+    # at a time. the queue is bounded, so no wallet is read far ahead of the
+    # consumer and none is held in memory whole
+    items: queue.Queue = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def put(entry: tuple) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(address: str):
+        try:
+            if stop.is_set():
+                return
+            for item in iterate(address):
+                if not put(("item", item)):
+                    return
+        except BaseException as e:
+            put(("error", e))
+            return
+        put(("done", None))
+
+    addresses = list(addresses)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for address in addresses:
+            executor.submit(produce, address)
+        try:
+            remaining = len(addresses)
+            while remaining:
+                kind, value = items.get()
+                if kind == "item":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    remaining -= 1
+        finally:
+            # an abandoned or failed run lets its producers go
+            stop.set()
+            executor.shutdown(cancel_futures=True)
+
+
+class TaggedCaajWriter:
+    def __init__(self, stream: IO[str]):
+        self.writer = csv.writer(stream, lineterminator="\n")
+        self.writer.writerow(["address"] + CAAJ_FIELDNAMES)
+
+    def write(self, address: str, caajs: Iterable):
+        journals = caajs if isinstance(caajs, JournalBuffer) else JournalBuffer(caajs)
+        for row in journals.iter_rows(journals.argsort()):
+            self.writer.writerow(
+                [address] + ["" if value is None else value for value in row]
+            )
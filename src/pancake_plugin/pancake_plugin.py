@@ -1,10 +1,25 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import time
 import uuid
-from decimal import Decimal
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
 
 from senkalib.caaj_journal import CaajJournal
 from senkalib.caaj_plugin import CaajPlugin
 from senkalib.platform.bsc.bsc_transaction import BscTransaction
-from senkalib.token_original_id_table import TokenOriginalIdTable
+
+from pancake_plugin.amount import DEFAULT_DECIMALS, decode_uint256, format_amount
+from pancake_plugin.classifier import EventClassifier
+from pancake_plugin.instrumentation import Instrumentation
+from pancake_plugin.journal_buffer import JournalBuffer
+from pancake_plugin.reward_rollup import RewardRollup
+from pancake_plugin.token_table import MemoizedTokenTable, TokenTableSnapshot
+
+if TYPE_CHECKING:
+    # only annotated, the module pulls in the http and dataframe stack
+    from senkalib.token_original_id_table import TokenOriginalIdTable
 
 # PancakeSwap: Router v2
 PANCAKESWAP_ADDRESS_TRADE = "0x10ED43C718714eb63d5aA57B78B54704E256024E"
@@ -21,6 +36,7 @@ PANCAKESWAP_ADDRESS = [
     PANCAKESWAP_ADDRESS_TRADE,
     CAKE_CONTRACT_ADDRESS,
 ]
+PANCAKESWAP_ADDRESS_SET = frozenset(address.lower() for address in PANCAKESWAP_ADDRESS)
 
 LP_DEPOSIT_TOPIC = "0x90890809c654f11d6e72a28fa60149770a0d11ec6c92319d6ceb2bb0a4ea1a15"
 LP_WITHDROW_TOPIC = "0xf279e6a1f5e320cca91135676d9cb6e44ca8a08c0b88342bcdb1144f6511b568"
@@ -51,17 +67,138 @@ ERC20_MINT_TOPIC = "0x4c209b5fc8ad50758f13e2e1088ba56a560dff690a1c6fef26394f4c03
 WEI = 10**18
 
 
+def to_topic_bytes(topic: str) -> bytes:
+    return bytes.fromhex(topic[2:])
+
+
+def to_address_bytes(address: Optional[str]) -> bytes:
+    # 20 bytes whatever the checksum case, b"" for a contract creation
+    return bytes.fromhex(address[2:]) if address else b""
+
+
+@functools.lru_cache(maxsize=4096)
+def to_checksum_address(address: bytes) -> str:
+    # imported on first use like in normalize_receipt, a wallet trades with
+    # a handful of counterparties so each is hashed once
+    from eth_utils import to_checksum_address
+
+    return to_checksum_address(address)
+
+
+# logs are matched on raw bytes, HexBytes topics compare and hash as bytes
+# and the last 20 bytes of an indexed address topic are the address itself
+ERC20_TRANSFER_TOPIC_BYTES = to_topic_bytes(ERC20_TRANSFER_TOPIC)
+ERC20_BURN_TOPIC_BYTES = to_topic_bytes(ERC20_BURN_TOPIC)
+ERC20_MINT_TOPIC_BYTES = to_topic_bytes(ERC20_MINT_TOPIC)
+WETH_DEPOSIT_TOPIC_BYTES = to_topic_bytes(WETH_DEPOSIT_TOPIC)
+WETH_WITHDRAWAL_TOPIC_BYTES = to_topic_bytes(WETH_WITHDRAWAL_TOPIC)
+WETH_EARN_WITHDRAWAL_TOPIC_BYTES = to_topic_bytes(WETH_EARN_WITHDRAWAL_TOPIC)
+LP_DEPOSIT_TOPIC_BYTES = to_topic_bytes(LP_DEPOSIT_TOPIC)
+LP_WITHDROW_TOPIC_BYTES = to_topic_bytes(LP_WITHDROW_TOPIC)
+PANCAKESWAP_ADDRESS_TRADE_BYTES = to_address_bytes(PANCAKESWAP_ADDRESS_TRADE)
+PANCAKESWAP_ADDRESS_EARN_BYTES = to_address_bytes(PANCAKESWAP_ADDRESS_EARN)
+PANCAKESWAP_SYRUP_ADDRESS_BYTES = to_address_bytes(PANCAKESWAP_SYRUP_ADDRESS)
+
+# namespace of the deterministic trade_uuid of this plugin's journals
+TRADE_UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "caaj://bsc/pancakeswap")
+
+# service of the journals of each branch
+BRANCH_SERVICES = {
+    "swap": "swap",
+    "liquidity_add": "liquidity",
+    "liquidity_remove": "liquidity",
+    "earn_stake": "staking",
+    "earn_unstake": "staking",
+}
+
+# (contract, required topics, branch), the first matching rule wins
+CLASSIFIER_RULES = [
+    (PANCAKESWAP_ADDRESS_TRADE_BYTES, [ERC20_BURN_TOPIC_BYTES], "liquidity_remove"),
+    (PANCAKESWAP_ADDRESS_TRADE_BYTES, [ERC20_MINT_TOPIC_BYTES], "liquidity_add"),
+    (PANCAKESWAP_ADDRESS_TRADE_BYTES, [], "swap"),
+    (
+        PANCAKESWAP_ADDRESS_EARN_BYTES,
+        [WETH_EARN_WITHDRAWAL_TOPIC_BYTES],
+        "earn_unstake",
+    ),
+    (PANCAKESWAP_ADDRESS_EARN_BYTES, [], "earn_stake"),
+]
+
+
+class ReceiptIndex:
+    def __init__(self, transaction: BscTransaction):
+        receipt = transaction.transaction_receipt
+        self.transaction = transaction
+        self.status = receipt["status"]
+        self.executed_at = transaction.get_timestamp()
+        self.transaction_id = transaction.get_transaction_id()
+        self.transaction_from = receipt["from"]
+        self.transaction_to = receipt["to"]
+        self.sender = to_address_bytes(receipt["from"])
+        self.recipient = to_address_bytes(receipt["to"])
+        self.fee = transaction.get_transaction_fee()
+        self.logs = receipt["logs"]
+        self.topics: list[bytes] = []
+        self.topic_positions: dict[bytes, int] = {}
+        self.transfer_logs: list = []
+        self.transfer_parties: list[tuple[bytes, bytes]] = []
+        self.transfers_by_from: dict[bytes, list] = {}
+        self.transfers_by_to: dict[bytes, list] = {}
+        # (topic, dst or src, log) of wbnb wrapping and unwrapping
+        self.wrap_logs: list[tuple[bytes, bytes, dict]] = []
+
+        for position, log in enumerate(self.logs):
+            topics = log["topics"]
+            if not topics:
+                self.topics.append(b"")
+                continue
+            topic = topics[0]
+            self.topics.append(topic)
+            self.topic_positions.setdefault(topic, position)
+            # HexBytes slices in python, plain bytes in C
+            if topic == ERC20_TRANSFER_TOPIC_BYTES and len(topics) > 2:
+                transfer_from = bytes(topics[1])[12:]
+                transfer_to = bytes(topics[2])[12:]
+                self.transfer_logs.append(log)
+                self.transfer_parties.append((transfer_from, transfer_to))
+                self.transfers_by_from.setdefault(transfer_from, []).append(log)
+                self.transfers_by_to.setdefault(transfer_to, []).append(log)
+            elif (
+                topic == WETH_DEPOSIT_TOPIC_BYTES
+                or topic == WETH_WITHDRAWAL_TOPIC_BYTES
+            ) and len(topics) > 1:
+                self.wrap_logs.append((topic, bytes(topics[1])[12:], log))
+
+    def has_topic(self, topic: bytes) -> bool:
+        return topic in self.topic_positions
+
+    def get_log_by_topic(self, topic: bytes) -> dict:
+        return self.logs[self.topic_positions[topic]]
+
+    def get_transfers_from(self, address: bytes) -> list:
+        return self.transfers_by_from.get(address, [])
+
+    def get_transfers_to(self, address: bytes) -> list:
+        return self.transfers_by_to.get(address, [])
+
+
 class PancakePlugin(CaajPlugin):
     platform = "bsc"
     application = "pancakeswap"
+    instrumentation: Optional[Instrumentation] = None
+    deterministic_uuid = False
 
     @classmethod
     def can_handle(cls, transaction) -> bool:
         swap_type = transaction.transaction_receipt["to"]
-        if swap_type in PANCAKESWAP_ADDRESS:
-            return True
-        else:
-            return False
+        return swap_type is not None and swap_type.lower() in PANCAKESWAP_ADDRESS_SET
+
+    @classmethod
+    def can_handle_many(cls, to_addresses: Iterable[Optional[str]]) -> list[bool]:
+        return [
+            swap_type is not None and swap_type.lower() in PANCAKESWAP_ADDRESS_SET
+            for swap_type in to_addresses
+        ]
 
     @classmethod
     def get_caajs(
@@ -69,79 +206,264 @@ class PancakePlugin(CaajPlugin):
         address: str,
         transaction: BscTransaction,
         token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup] = None,
     ) -> list:
-        caajs = []
-        trade_uuid = cls._get_uuid()
-        topics = list(
-            map(
-                lambda log: log["topics"][0].hex().lower(),
-                transaction.transaction_receipt["logs"],
-            )
+        return [
+            CaajJournal(*row)
+            for row in cls.__get_rows(transaction, token_table, rewards)
+        ]
+
+    @classmethod
+    def __get_rows(
+        cls,
+        transaction: BscTransaction,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        # journals are decoded as tuples of their fields in CAAJ_FIELDNAMES
+        # order, journal_many appends them to its columns as they are
+        if cls.instrumentation is None:
+            return cls.__get_rows_of_transaction(transaction, token_table, rewards)[1]
+        start = time.perf_counter()
+        branch, rows = cls.__get_rows_of_transaction(transaction, token_table, rewards)
+        cls.instrumentation.observe(
+            branch, time.perf_counter() - start, transaction.get_transaction_id()
         )
-        if transaction.transaction_receipt["status"] == 1:
-            if transaction.transaction_receipt["to"] == PANCAKESWAP_ADDRESS_TRADE:
-
-                if ERC20_BURN_TOPIC in topics:
-                    # TODO: liquidity remove
-                    # caaj_main = cls__get_caaj_liquidity_remove(
-                    #     transaction, topics
-                    # )
-                    caaj_fee = cls.__get_caaj_fee(
-                        transaction, "pancakeswap transaction fee", trade_uuid
-                    )
-                    caajs.append(caaj_fee)
-                elif ERC20_MINT_TOPIC in topics:
-                    # TODO: liquidity add
-                    # caaj_main = cls__get_caaj_liquidity_add(
-                    #     transaction, topics
-                    # )
-                    caaj_fee = cls.__get_caaj_fee(
-                        transaction, "pancakeswap transaction fee", trade_uuid
-                    )
-                    caajs.append(caaj_fee)
+        return rows
 
-                else:
-                    # exchange
-                    caajs = cls.__get_caaj_exchange(
-                        transaction, topics, trade_uuid, token_table
-                    )
-                    caaj_fee = cls.__get_caaj_fee(
-                        transaction, "pancakeswap transaction fee", trade_uuid
-                    )
-                    caajs.append(caaj_fee)
-
-            elif transaction.transaction_receipt["to"] == PANCAKESWAP_ADDRESS_EARN:
-                if WETH_EARN_WITHDRAWAL_TOPIC in topics:
-                    # TODO: unstake
-                    # caaj_main = cls.__get_caaj_farms_unstake(transaction)
-                    caaj_fee = cls.__get_caaj_fee(
-                        transaction, "pancakeswap transaction fee", trade_uuid
-                    )
-                    caajs.append(caaj_fee)
-                    # caaj_reward = cls.__get_caaj_farms_reward(transaction)
-
-                else:
-                    # TODO: stake and harvest
-                    # caaj_main = cls.__get_caaj_farms_stake(transaction)
-                    caaj_fee = cls.__get_caaj_fee(
-                        transaction, "pancakeswap transaction fee", trade_uuid
+    @classmethod
+    def __get_rows_of_transaction(
+        cls,
+        transaction: BscTransaction,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> tuple:
+        index = ReceiptIndex(transaction)
+        branch = cls.__classify(index)
+        if branch in ("failed", "other"):
+            return branch, []
+        trade_uuid = cls._get_uuid(index.transaction_id)
+        return branch, cls.__get_rows_of_sender(
+            index, branch, trade_uuid, token_table, rewards
+        )
+
+    @classmethod
+    def __classify(cls, index: ReceiptIndex) -> str:
+        if index.status != 1:
+            return "failed"
+        branch = cls.classifier.classify(index.recipient, index.topic_positions)
+        return "other" if branch is None else branch
+
+    @classmethod
+    def __get_rows_of_sender(
+        cls,
+        index: ReceiptIndex,
+        branch: str,
+        trade_uuid: str,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        rows = cls.__handlers[branch](cls, index, trade_uuid, token_table, rewards)
+        rows.append(
+            cls.__get_caaj_fee(index, "pancakeswap transaction fee", trade_uuid)
+        )
+        return rows
+
+    @classmethod
+    def get_caajs_by_address(
+        cls,
+        addresses: Iterable[str],
+        transaction: BscTransaction,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup] = None,
+    ) -> dict[str, list[CaajJournal]]:
+        # the receipt is decoded once for every tracked wallet. the sender
+        # gets the journals of get_caajs, any other tracked wallet one row
+        # per transfer it sent or received in the transaction
+        return {
+            address: [CaajJournal(*row) for row in rows]
+            for address, rows in cls.__get_rows_by_address(
+                addresses, transaction, token_table, rewards
+            ).items()
+        }
+
+    @classmethod
+    def __get_rows_by_address(
+        cls,
+        addresses: Iterable[str],
+        transaction: BscTransaction,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> dict[str, list[tuple]]:
+        tracked = {to_address_bytes(address): address for address in addresses}
+        if cls.instrumentation is None:
+            return cls.__get_rows_of_transaction_by_address(
+                tracked, transaction, token_table, rewards
+            )[1]
+        start = time.perf_counter()
+        branch, rows = cls.__get_rows_of_transaction_by_address(
+            tracked, transaction, token_table, rewards
+        )
+        cls.instrumentation.observe(
+            branch, time.perf_counter() - start, transaction.get_transaction_id()
+        )
+        return rows
+
+    @classmethod
+    def __get_rows_of_transaction_by_address(
+        cls,
+        tracked: dict[bytes, str],
+        transaction: BscTransaction,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> tuple:
+        rows: dict[str, list[tuple]] = {address: [] for address in tracked.values()}
+        index = ReceiptIndex(transaction)
+        branch = cls.__classify(index)
+        if branch in ("failed", "other"):
+            return branch, rows
+        trade_uuid = cls._get_uuid(index.transaction_id)
+        if index.sender in tracked:
+            rows[tracked[index.sender]] = cls.__get_rows_of_sender(
+                index, branch, trade_uuid, token_table, rewards
+            )
+
+        for log, (transfer_from, transfer_to) in zip(
+            index.transfer_logs, index.transfer_parties
+        ):
+            for party, caaj_type, counterparty in [
+                (transfer_from, "lose", transfer_to),
+                (transfer_to, "get", transfer_from),
+            ]:
+                if party == index.sender or party not in tracked:
+                    continue
+                address = tracked[party]
+                counterparty_address = to_checksum_address(counterparty)
+                rows[address].append(
+                    (
+                        index.executed_at,
+                        cls.platform,
+                        cls.application,
+                        BRANCH_SERVICES[branch],
+                        index.transaction_id,
+                        trade_uuid,
+                        caaj_type,
+                        format_amount(
+                            decode_uint256(log["data"]),
+                            cls.get_decimals(token_table, log["address"]),
+                        ),
+                        token_table.get_uti(cls.platform, log["address"]),
+                        address if caaj_type == "lose" else counterparty_address,
+                        counterparty_address if caaj_type == "lose" else address,
+                        "pancakeswap transfer",
                     )
-                    caajs.append(caaj_fee)
-        return caajs
+                )
+        return branch, rows
+
+    @classmethod
+    def get_caajs_many(
+        cls,
+        address: str,
+        transactions: Iterable[BscTransaction],
+        token_table: TokenOriginalIdTable,
+        aggregate_rewards: bool = False,
+    ) -> list:
+        return list(
+            cls.iter_caajs_many(address, transactions, token_table, aggregate_rewards)
+        )
 
     @classmethod
-    def __get_caaj_fee(cls, transaction: BscTransaction, comment: str, trade_uuid: str):
-        return CaajJournal(
-            transaction.get_timestamp(),
+    def iter_caajs_many(
+        cls,
+        address: str,
+        transactions: Iterable[BscTransaction],
+        token_table: TokenOriginalIdTable,
+        aggregate_rewards: bool = False,
+    ) -> Iterator[CaajJournal]:
+        for row in cls.__iter_rows_many(transactions, token_table, aggregate_rewards):
+            yield CaajJournal(*row)
+
+    @classmethod
+    def __iter_rows_many(
+        cls,
+        transactions: Iterable[BscTransaction],
+        token_table: TokenOriginalIdTable,
+        aggregate_rewards: bool,
+    ) -> Iterator[tuple]:
+        if not isinstance(token_table, MemoizedTokenTable):
+            token_table = MemoizedTokenTable(token_table)
+        # with aggregate_rewards harvests are rolled up per pool per day,
+        # a day is emitted once a later transaction shows up
+        rewards = RewardRollup() if aggregate_rewards else None
+        for transaction in transactions:
+            if cls.can_handle(transaction):
+                rows = cls.__get_rows(transaction, token_table, rewards)
+                if rewards is not None:
+                    for caaj in rewards.flush(transaction.get_timestamp()[:10]):
+                        yield dataclasses.astuple(caaj)
+                yield from rows
+        if rewards is not None:
+            for caaj in rewards.flush():
+                yield dataclasses.astuple(caaj)
+
+    @classmethod
+    def journal_many(
+        cls,
+        address: str,
+        transactions: Iterable[BscTransaction],
+        token_table: TokenOriginalIdTable,
+        aggregate_rewards: bool = False,
+        journals: Optional[JournalBuffer] = None,
+    ) -> JournalBuffer:
+        # the fields of each journal go straight into the columns, no
+        # CaajJournal is built on the way
+        if journals is None:
+            journals = JournalBuffer()
+        for row in cls.__iter_rows_many(transactions, token_table, aggregate_rewards):
+            journals.append_row(row)
+        return journals
+
+    @classmethod
+    def journal_many_by_address(
+        cls,
+        addresses: Iterable[str],
+        transactions: Iterable[BscTransaction],
+        token_table: TokenOriginalIdTable,
+    ) -> dict[str, JournalBuffer]:
+        # the transactions of related wallets overlap, each one is journaled
+        # once for all of them
+        addresses = list(addresses)
+        if not isinstance(token_table, MemoizedTokenTable):
+            token_table = MemoizedTokenTable(token_table)
+        journals = {address: JournalBuffer() for address in addresses}
+        seen: set[str] = set()
+        for transaction in transactions:
+            transaction_id = transaction.get_transaction_id().lower()
+            if transaction_id in seen or not cls.can_handle(transaction):
+                continue
+            seen.add(transaction_id)
+            for address, rows in cls.__get_rows_by_address(
+                addresses, transaction, token_table, None
+            ).items():
+                for row in rows:
+                    journals[address].append_row(row)
+        return journals
+
+    @classmethod
+    def __get_caaj_fee(
+        cls, index: ReceiptIndex, comment: str, trade_uuid: str
+    ) -> tuple:
+        return (
+            index.executed_at,
             cls.platform,
             cls.application,
             cls.platform,
-            transaction.get_transaction_id(),
+            index.transaction_id,
             trade_uuid,
             "lose",
-            str(Decimal(transaction.get_transaction_fee()) / Decimal(WEI)),
+            format_amount(int(index.fee)),
             "bnb/bsc",
-            transaction.transaction_receipt["from"],
+            index.transaction_from,
             "0x0000000000000000000000000000000000000000",
             comment,
         )
@@ -149,486 +471,275 @@ class PancakePlugin(CaajPlugin):
     @classmethod
     def __get_caaj_exchange(
         cls,
-        transaction: BscTransaction,
-        topics: list[str],
+        index: ReceiptIndex,
         trade_uuid: str,
         token_table: TokenOriginalIdTable,
-    ) -> list[CaajJournal]:
-        caajs = []
-        caaj_common = cls.__get_caaj_common(transaction)
-        if WETH_DEPOSIT_TOPIC in topics:
-            credit_log_index = topics.index(WETH_DEPOSIT_TOPIC)
-
-            uti = token_table.get_uti(cls.platform, WBNB_CONTRACT_ADDRESS)
-
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "lose",
-                    str(
-                        Decimal(
-                            int(
-                                transaction.transaction_receipt["logs"][
-                                    credit_log_index
-                                ]["data"],
-                                16,
-                            )
-                        )
-                        / Decimal(WEI)
-                    ),
-                    uti,
-                    caaj_common["credit_from"],
-                    caaj_common["credit_to"],
-                    "pancakeswap swap",
-                )
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        # net flow of every token for the sender in one pass, which covers
+        # multi-hop paths, fee-on-transfer tokens and refunds alike. bnb
+        # moves natively, the wbnb wrapped or unwrapped by the called
+        # contract stands for it
+        flows: dict[str, list] = {}
+        for log, (transfer_from, transfer_to) in zip(
+            index.transfer_logs, index.transfer_parties
+        ):
+            if transfer_from == index.sender:
+                value = -decode_uint256(log["data"])
+            elif transfer_to == index.sender:
+                value = decode_uint256(log["data"])
+            else:
+                continue
+            flow = flows.setdefault(log["address"].lower(), [log["address"], 0])
+            flow[1] += value
+        for topic, party, log in index.wrap_logs:
+            if party != index.recipient:
+                continue
+            value = decode_uint256(log["data"])
+            flow = flows.setdefault(
+                WBNB_CONTRACT_ADDRESS.lower(), [WBNB_CONTRACT_ADDRESS, 0]
             )
-
-            debit_log = list(
-                filter(
-                    lambda log: "0x" + log["topics"][2].hex().lower()[26:]
-                    == transaction.transaction_receipt["from"].lower(),
-                    cls.__get_transfer_logs_from_transaction(transaction),
-                )
-            )[-1]
-
-            uti = token_table.get_uti(cls.platform, debit_log["address"])
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "get",
-                    str(Decimal(int(debit_log["data"], 16)) / Decimal(WEI)),
-                    uti,
-                    caaj_common["debit_from"],
-                    caaj_common["debit_to"],
-                    "pancakeswap swap",
+            flow[1] += -value if topic == WETH_DEPOSIT_TOPIC_BYTES else value
+
+        caaj_common = cls.__get_caaj_common(index)
+        losses = []
+        gains = []
+        for token_address, value in flows.values():
+            if value < 0:
+                losses.append((token_address, -value))
+            elif value > 0:
+                gains.append((token_address, value))
+
+        rows = []
+        for caaj_type, legs, caaj_from, caaj_to in [
+            ("lose", losses, "credit_from", "credit_to"),
+            ("get", gains, "debit_from", "debit_to"),
+        ]:
+            for token_address, value in legs:
+                rows.append(
+                    (
+                        index.executed_at,
+                        cls.platform,
+                        cls.application,
+                        "swap",
+                        index.transaction_id,
+                        trade_uuid,
+                        caaj_type,
+                        format_amount(
+                            value, cls.get_decimals(token_table, token_address)
+                        ),
+                        token_table.get_uti(cls.platform, token_address),
+                        caaj_common[caaj_from],
+                        caaj_common[caaj_to],
+                        "pancakeswap swap",
+                    )
                 )
-            )
+        return rows
 
-        elif WETH_WITHDRAWAL_TOPIC in topics:
-            debit_log_index = topics.index(WETH_WITHDRAWAL_TOPIC)
-            credit_log = list(
-                filter(
-                    lambda log: "0x" + log["topics"][1].hex().lower()[26:]
-                    == transaction.transaction_receipt["from"].lower(),
-                    cls.__get_transfer_logs_from_transaction(transaction),
-                )
-            )[0]
-
-            uti = token_table.get_uti(cls.platform, credit_log["address"])
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "lose",
-                    str(Decimal(int(credit_log["data"], 16)) / Decimal(WEI)),
-                    uti,
-                    caaj_common["credit_from"],
-                    caaj_common["credit_to"],
-                    "pancakeswap swap",
+    @classmethod
+    def __get_caaj_liquidity_add(
+        cls,
+        index: ReceiptIndex,
+        trade_uuid: str,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        # a leg without transfers, e.g. lp tokens minted to another address,
+        # is left out rather than failing the transaction
+        if index.has_topic(WETH_DEPOSIT_TOPIC_BYTES):
+            # include bnb
+            credit_logs = [
+                (
+                    index.get_log_by_topic(WETH_DEPOSIT_TOPIC_BYTES),
+                    WBNB_CONTRACT_ADDRESS,
                 )
-            )
+            ] + [(log, None) for log in index.get_transfers_from(index.sender)[:1]]
+        else:
+            credit_logs = [
+                (log, None) for log in index.get_transfers_from(index.sender)
+            ]
+        debit_logs = [(log, None) for log in index.get_transfers_to(index.sender)[-1:]]
+        return cls.__get_caaj_liquidity(
+            index,
+            trade_uuid,
+            token_table,
+            credit_logs,
+            debit_logs,
+            "pancakeswap add liquidity",
+        )
 
-            uti = token_table.get_uti(cls.platform, WBNB_CONTRACT_ADDRESS)
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "get",
-                    str(
-                        Decimal(
-                            int(
-                                transaction.transaction_receipt["logs"][
-                                    debit_log_index
-                                ]["data"],
-                                16,
-                            )
-                        )
-                        / Decimal(WEI)
-                    ),
-                    uti,
-                    caaj_common["debit_from"],
-                    caaj_common["debit_to"],
-                    "pancakeswap swap",
+    @classmethod
+    def __get_caaj_liquidity_remove(
+        cls,
+        index: ReceiptIndex,
+        trade_uuid: str,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        # as for adds, a leg without transfers is left out
+        credit_logs = [
+            (log, None) for log in index.get_transfers_from(index.sender)[:1]
+        ]
+        if index.has_topic(WETH_WITHDRAWAL_TOPIC_BYTES):
+            debit_logs = [
+                (log, None) for log in index.get_transfers_to(index.sender)[-1:]
+            ] + [
+                (
+                    index.get_log_by_topic(WETH_WITHDRAWAL_TOPIC_BYTES),
+                    WBNB_CONTRACT_ADDRESS,
                 )
-            )
-
+            ]
         else:
-            credit_log = list(
-                filter(
-                    lambda log: f"0x{log['topics'][1].hex().lower()[26:]}"
-                    == transaction.transaction_receipt["from"].lower(),
-                    cls.__get_transfer_logs_from_transaction(transaction),
+            debit_logs = [(log, None) for log in index.get_transfers_to(index.sender)]
+        return cls.__get_caaj_liquidity(
+            index,
+            trade_uuid,
+            token_table,
+            credit_logs,
+            debit_logs,
+            "pancakeswap remove liquidity",
+        )
+
+    @classmethod
+    def __get_caaj_liquidity(
+        cls,
+        index: ReceiptIndex,
+        trade_uuid: str,
+        token_table: TokenOriginalIdTable,
+        credit_logs: list[tuple],
+        debit_logs: list[tuple],
+        comment: str,
+    ) -> list[tuple]:
+        # logs are paired with the token they move, None for the log's
+        # own contract; wbnb deposit/withdrawal logs stand for bnb
+        caaj_common = cls.__get_caaj_common(index)
+        rows = []
+        for caaj_type, logs, caaj_from, caaj_to in [
+            ("lose", credit_logs, "credit_from", "credit_to"),
+            ("get", debit_logs, "debit_from", "debit_to"),
+        ]:
+            for log, token_address in logs:
+                token_address = token_address or log["address"]
+                rows.append(
+                    (
+                        index.executed_at,
+                        cls.platform,
+                        cls.application,
+                        "liquidity",
+                        index.transaction_id,
+                        trade_uuid,
+                        caaj_type,
+                        format_amount(
+                            decode_uint256(log["data"]),
+                            cls.get_decimals(token_table, token_address),
+                        ),
+                        token_table.get_uti(cls.platform, token_address),
+                        caaj_common[caaj_from],
+                        caaj_common[caaj_to],
+                        comment,
+                    )
                 )
-            )[0]
-            uti = token_table.get_uti(cls.platform, credit_log["address"])
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "lose",
-                    str(Decimal(int(credit_log["data"], 16)) / Decimal(WEI)),
-                    uti,
+        return rows
+
+    @classmethod
+    def __get_caaj_earn(
+        cls,
+        index: ReceiptIndex,
+        trade_uuid: str,
+        token_table: TokenOriginalIdTable,
+        rewards: Optional[RewardRollup],
+    ) -> list[tuple]:
+        # stake, unstake and harvest legs are told apart by the parties of
+        # each transfer, so one pass over the transfers decodes all of them
+        caaj_common = cls.__get_caaj_common(index)
+        pool_id = cls.get_pool_id(index)
+        rows = []
+        for log, (transfer_from, transfer_to) in zip(
+            index.transfer_logs, index.transfer_parties
+        ):
+            if transfer_from == index.sender and transfer_to == index.recipient:
+                caaj_type, comment = "deposit", "pancakeswap stake"
+                caaj_from, caaj_to = (
                     caaj_common["credit_from"],
                     caaj_common["credit_to"],
-                    "pancakeswap swap",
-                )
-            )
-            debit_log = list(
-                filter(
-                    lambda log: f"0x{log['topics'][2].hex().lower()[26:]}"
-                    == transaction.transaction_receipt["from"].lower(),
-                    cls.__get_transfer_logs_from_transaction(transaction),
-                )
-            )[-1]
-            uti = token_table.get_uti(cls.platform, debit_log["address"])
-            caajs.append(
-                CaajJournal(
-                    transaction.get_timestamp(),
-                    cls.platform,
-                    cls.application,
-                    "swap",
-                    transaction.get_transaction_id(),
-                    trade_uuid,
-                    "get",
-                    str(Decimal(int(debit_log["data"], 16)) / Decimal(WEI)),
-                    uti,
-                    caaj_common["debit_from"],
-                    caaj_common["debit_to"],
-                    "pancakeswap swap",
                 )
+            elif transfer_from == index.recipient and transfer_to == index.sender:
+                caaj_type, comment = "withdraw", "pancakeswap unstake"
+                caaj_from, caaj_to = caaj_common["debit_from"], caaj_common["debit_to"]
+            elif (
+                transfer_from == PANCAKESWAP_SYRUP_ADDRESS_BYTES
+                and transfer_to == index.sender
+            ):
+                caaj_type, comment = "get", "pancakeswap reward"
+                caaj_from, caaj_to = SYRUP_CONTRACT_ADDRESS, index.transaction_from
+            else:
+                continue
+
+            value = decode_uint256(log["data"])
+            decimals = cls.get_decimals(token_table, log["address"])
+            row = (
+                index.executed_at,
+                cls.platform,
+                cls.application,
+                "staking",
+                index.transaction_id,
+                trade_uuid,
+                caaj_type,
+                format_amount(value, decimals),
+                token_table.get_uti(cls.platform, log["address"]),
+                caaj_from,
+                caaj_to,
+                comment,
             )
+            if caaj_type == "get" and rewards is not None:
+                rewards.add(pool_id, CaajJournal(*row), value, decimals)
+            else:
+                rows.append(row)
+        return rows
+
+    @classmethod
+    def get_pool_id(cls, index: ReceiptIndex) -> Optional[int]:
+        # Deposit(user, pid, amount) and Withdraw(user, pid, amount)
+        for topic in [LP_DEPOSIT_TOPIC_BYTES, LP_WITHDROW_TOPIC_BYTES]:
+            if index.has_topic(topic):
+                topics = index.get_log_by_topic(topic)["topics"]
+                if len(topics) > 2:
+                    return int.from_bytes(topics[2], "big")
+        return None
 
-        return caajs
-
-    # TODO: liquidity系が利用できるようになったら実装
-    # @classmethod
-    # def __get_caaj_liquidity_add(cls, transaction, topics):
-    #     caaj_common = cls.__get_caaj_common(transaction)
-
-    #     if WETH_DEPOSIT_TOPIC in topics:
-    #         # incluede bnb
-    #         credit_log_index_1 = topics.index(WETH_DEPOSIT_TOPIC)
-    #         credit_log_2 = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][1].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[0]
-    #         debit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][2].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[-1]
-    #         caaj_main = {
-    #             "debit_title": "LIQUIDITY",
-    #             "debit_amount": {
-    #                 debit_log["address"].lower(): str(
-    #                     Decimal(int(debit_log["data"].lower(), 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "credit_title": "SPOT",
-    #             "credit_amount": {
-    #                 cls.CHAIN_CONTRACT: str(
-    #                     Decimal(
-    #                         int(
-    #                             transaction.transaction_receipt["logs"][
-    #                                 credit_log_index_1
-    #                             ]["data"].lower(),
-    #                             16,
-    #                         )
-    #                     )
-    #                     / Decimal(WEI)
-    #                 ),
-    #                 credit_log_2["address"].lower(): str(
-    #                     Decimal(int(credit_log_2["data"].lower(), 16)) / Decimal(WEI)
-    #                 ),
-    #             },
-    #             "comment": "pancakeswap add liquidity",
-    #         }
-    #         caaj_main.update(caaj_common)
-    #         return caaj_main
-
-    #     else:
-    #         credit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][1].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )
-    #         debit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][2].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[-1]
-    #         caaj_main = {
-    #             "debit_title": "LIQUIDITY",
-    #             "debit_amount": {
-    #                 debit_log["address"]: str(
-    #                     Decimal(int(debit_log["data"], 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "credit_title": "SPOT",
-    #             "credit_amount": {
-    #                 credit_log[0]["address"]: str(
-    #                     Decimal(int(credit_log[0]["data"], 16)) / Decimal(WEI)
-    #                 ),
-    #                 credit_log[1]["address"]: str(
-    #                     Decimal(int(credit_log[1]["data"], 16)) / Decimal(WEI)
-    #                 ),
-    #             },
-    #             "comment": "pancakeswap add liquidity",
-    #         }
-    #         caaj_main.update(caaj_common)
-    #         return caaj_main
-
-    # @classmethod
-    # def __get_caaj_liquidity_remove(cls, transaction, topics):
-    #     caaj_common = cls.__get_caaj_common(transaction)
-    #     if WETH_WITHDRAWAL_TOPIC in topics:
-    #         debit_log_1_index = topics.index(WETH_WITHDRAWAL_TOPIC)
-    #         debit_log_2 = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][2].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[-1]
-
-    #         credit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][1].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[0]
-    #         caaj_main = {
-    #             "debit_title": "SPOT",
-    #             "debit_amount": {
-    #                 debit_log_2["address"]: str(
-    #                     Decimal(int(debit_log_2["data"], 16)) / Decimal(WEI)
-    #                 ),
-    #                 cls.CHAIN_CONTRACT: str(
-    #                     Decimal(
-    #                         int(
-    #                             transaction.transaction_receipt["logs"][
-    #                                 debit_log_1_index
-    #                             ]["data"],
-    #                             16,
-    #                         )
-    #                     )
-    #                     / Decimal(WEI)
-    #                 ),
-    #             },
-    #             "credit_title": "LIQUIDITY",
-    #             "credit_amount": {
-    #                 credit_log["address"]: str(
-    #                     Decimal(int(credit_log["data"], 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "comment": "pancakeswap remove liquidity",
-    #         }
-    #         caaj_main.update(caaj_common)
-    #         return caaj_main
-    #     else:
-    #         debit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][2].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )
-    #         credit_log = list(
-    #             filter(
-    #                 lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #                 and "0x" + log["topics"][1].hex().lower()[26:]
-    #                 == transaction.transaction_receipt["from"].lower(),
-    #                 transaction.transaction_receipt["logs"],
-    #             )
-    #         )[0]
-    #         caaj_main = {
-    #             "debit_title": "SPOT",
-    #             "debit_amount": {
-    #                 debit_log[0]["address"]: str(
-    #                     Decimal(int(debit_log[0]["data"], 16)) / Decimal(WEI)
-    #                 ),
-    #                 debit_log[1]["address"]: str(
-    #                     Decimal(int(debit_log[1]["data"], 16)) / Decimal(WEI)
-    #                 ),
-    #             },
-    #             "credit_title": "LIQUIDITY",
-    #             "credit_amount": {
-    #                 credit_log["address"]: str(
-    #                     Decimal(int(credit_log["data"], 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "comment": "pancakeswap remove liquidity",
-    #         }
-    #         caaj_main.update(caaj_common)
-    #         return caaj_main
+    @classmethod
+    def get_decimals(cls, token_table: TokenOriginalIdTable, token_original_id: str):
+        # senkalib's table does not know decimals, 18 is the BEP-20 default
+        if isinstance(token_table, (TokenTableSnapshot, MemoizedTokenTable)):
+            decimals = token_table.get_decimals(cls.platform, token_original_id)
+            if decimals is not None:
+                return decimals
+        return DEFAULT_DECIMALS
 
     @classmethod
-    def __get_caaj_common(cls, transaction):
+    def __get_caaj_common(cls, index: ReceiptIndex):
         caaj_common = {
-            "transaction_id": transaction.transaction_receipt["transactionHash"],
-            "debit_from": transaction.transaction_receipt["to"],
-            "debit_to": transaction.transaction_receipt["from"],
-            "credit_from": transaction.transaction_receipt["from"],
-            "credit_to": transaction.transaction_receipt["to"],
+            "transaction_id": index.transaction_id,
+            "debit_from": index.transaction_to,
+            "debit_to": index.transaction_from,
+            "credit_from": index.transaction_from,
+            "credit_to": index.transaction_to,
         }
         return caaj_common
 
     @classmethod
-    def __get_transfer_logs_from_transaction(cls, transaction: BscTransaction) -> list:
-        return list(
-            filter(
-                lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC,
-                transaction.transaction_receipt["logs"],
-            )
-        )
-
-    # TODO: liquidity系が利用できるようになったら実装
-    # @classmethod
-    # def __get_caaj_farms_unstake(cls, transaction):
-    #     caaj_common = cls.__get_caaj_common(transaction)
-
-    #     debit_log = list(
-    #         filter(
-    #             lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #             and "0x" + log["topics"][2].hex().lower()[26:]
-    #             == transaction.transaction_receipt["from"].lower()
-    #             and "0x" + log["topics"][1].hex().lower()[26:]
-    #             == transaction.transaction_receipt["to"].lower(),
-    #             transaction.transaction_receipt["logs"],
-    #         )
-    #     )[0]
-    #     caaj_main = {
-    #         "debit_title": "LIQUIDITY",
-    #         "debit_amount": {
-    #             debit_log["address"]: str(
-    #                 Decimal(int(debit_log["data"], 16)) / Decimal(WEI)
-    #             )
-    #         },
-    #         "credit_title": "UNSTAKE",
-    #         "credit_amount": {
-    #             debit_log["address"]: str(
-    #                 Decimal(int(debit_log["data"], 16)) / Decimal(WEI)
-    #             )
-    #         },
-    #         "comment": "pancakeswap reward",
-    #     }
-    #     caaj_main.update(caaj_common)
-    #     return caaj_main
-
-    # @classmethod
-    # def __get_caaj_farms_reward(cls, transaction):
-    #     debit_log_reward = list(
-    #         filter(
-    #             lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #             and "0x" + log["topics"][2].hex().lower()[26:]
-    #             == transaction.transaction_receipt["from"].lower()
-    #             and "0x" + log["topics"][1].hex().lower()[26:]
-    #             == SYRUP_CONTRACT_ADDRESS.lower(),
-    #             transaction.transaction_receipt["logs"],
-    #         )
-    #     )[0]
-
-    #     caaj_reward = {
-    #         "time": transaction.get_timestamp(),
-    #         "platform": cls.PLATFORM,
-    #         "transaction_id": transaction.transaction_receipt["transactionHash"],
-    #         "debit_title": "SPOT",
-    #         "debit_from": SYRUP_CONTRACT_ADDRESS,
-    #         "debit_to": transaction.transaction_receipt["from"],
-    #         "debit_amount": {
-    #             debit_log_reward["address"]: str(
-    #                 Decimal(int(debit_log_reward["data"], 16)) / Decimal(WEI)
-    #             )
-    #         },
-    #         "credit_title": "STAKINGREWARD",
-    #         "credit_amount": {
-    #             debit_log_reward["address"]: str(
-    #                 Decimal(int(debit_log_reward["data"], 16)) / Decimal(WEI)
-    #             )
-    #         },
-    #         "credit_from": transaction.transaction_receipt["from"],
-    #         "credit_to": SYRUP_CONTRACT_ADDRESS,
-    #         "comment": "pancakeswap reward",
-    #     }
-    #     return caaj_reward
-
-    # @classmethod
-    # def __get_caaj_farms_stake(cls, transaction):
-    #     caaj_common = cls.__get_caaj_common(transaction)
-
-    #     debit_log = list(
-    #         filter(
-    #             lambda log: log["topics"][0].hex().lower() == ERC20_TRANSFER_TOPIC
-    #             and "0x" + log["topics"][1].hex().lower()[26:]
-    #             == transaction.transaction_receipt["from"].lower()
-    #             and "0x" + log["topics"][2].hex().lower()[26:]
-    #             == transaction.transaction_receipt["to"].lower(),
-    #             transaction.transaction_receipt["logs"],
-    #         )
-    #     )
-    #     if len(debit_log) == 0:
-    #         # harvest
-    #         caaj_harvest = cls.__get_caaj_farms_reward(transaction)
-    #         return caaj_harvest
-    #     else:
-    #         # stake
-    #         caaj_main = {
-    #             "debit_title": "STAKING",
-    #             "debit_amount": {
-    #                 debit_log[0]["address"]: str(
-    #                     Decimal(int(debit_log[0]["data"], 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "credit_title": "LIQUIDITY",
-    #             "credit_amount": {
-    #                 debit_log[0]["address"]: str(
-    #                     Decimal(int(debit_log[0]["data"], 16)) / Decimal(WEI)
-    #                 )
-    #             },
-    #             "comment": "pancakeswap stake",
-    #         }
-    #         caaj_main.update(caaj_common)
-    #         return caaj_main
-
-    @classmethod
-    def _get_uuid(cls) -> str:
+    def _get_uuid(cls, transaction_id: Optional[str] = None) -> str:
+        # deterministic_uuid gives a rerun the same trade_uuid, so journals of
+        # overlapping runs can be merged by key
+        if cls.deterministic_uuid and transaction_id is not None:
+            return str(uuid.uuid5(TRADE_UUID_NAMESPACE, transaction_id.lower()))
         return str(uuid.uuid4())
+
+    classifier = EventClassifier(CLASSIFIER_RULES)
+    __handlers = {
+        "swap": __get_caaj_exchange.__func__,
+        "liquidity_add": __get_caaj_liquidity_add.__func__,
+        "liquidity_remove": __get_caaj_liquidity_remove.__func__,
+        "earn_stake": __get_caaj_earn.__func__,
+        "earn_unstake": __get_caaj_earn.__func__,
+    }
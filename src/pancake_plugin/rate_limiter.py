@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+# calls per second of a free BSCScan api key
+BSCSCAN_RATE = 5.0
+MIN_RATE = 0.5
+# share of the configured rate won back by every successful call
+RECOVERY_STEP = 0.05
+# seconds after a throttle in which further rate limited calls are the same
+# burst and do not lower the rate again
+THROTTLE_WINDOW = 1.0
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def get_backoff(
+    attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP
+) -> float:
+    # full jitter, retries of concurrent workers do not hit the api together
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float = BSCSCAN_RATE,
+        burst: Optional[float] = None,
+        min_rate: float = MIN_RATE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        # a token bucket refilled at rate tokens per second. the rate halves
+        # once per burst of rate limited calls and grows back by small steps
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        # bumped by every throttle, a call granted before it has nothing new
+        # to tell when it comes back rate limited
+        self.epoch = 0
+        self.throttled_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def acquire(self) -> int:
+        # a call without a token reserves the next one and waits for it.
+        # returns the epoch the call was granted in, for throttle
+        with self.lock:
+            self.__refill(self.clock())
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+            epoch = self.epoch
+        if wait > 0:
+            self.sleep(wait)
+        return epoch
+
+    def throttle(self, epoch: Optional[int] = None) -> bool:
+        with self.lock:
+            now = self.clock()
+            if (epoch is not None and epoch != self.epoch) or (
+                now - self.throttled_at < THROTTLE_WINDOW
+            ):
+                return False
+            self.__refill(now)
+            rate = max(self.min_rate, self.rate / 2)
+            # the calls already granted were too many, start from empty. the
+            # waits of outstanding reservations are already set, what they
+            # owe is kept as the same time at the new rate
+            self.tokens = min(self.tokens, 0.0) * rate / self.rate
+            self.rate = rate
+            self.epoch += 1
+            self.throttled_at = now
+            return True
+
+    def __refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
@@ -0,0 +1,119 @@
+import json
+import sqlite3
+import threading
+import zlib
+from typing import Optional
+
+from hexbytes import HexBytes
+from senkalib.platform.bsc.bsc_transaction import BscTransaction
+
+RECEIPT_FIELDS = ["transactionHash", "blockNumber", "from", "to", "status"]
+LOG_FIELDS = ["address", "data", "logIndex"]
+
+
+def to_hex(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return value
+
+
+def to_record(tx: dict, receipt: dict) -> dict:
+    return {
+        "hash": tx["hash"],
+        "timeStamp": str(tx["timeStamp"]),
+        "gasUsed": str(tx["gasUsed"]),
+        "gasPrice": str(tx["gasPrice"]),
+        "receipt": {
+            **{field: to_hex(receipt.get(field)) for field in RECEIPT_FIELDS},
+            "logs": [
+                {
+                    **{field: to_hex(log.get(field)) for field in LOG_FIELDS},
+                    "topics": [to_hex(topic) for topic in log["topics"]],
+                }
+                for log in receipt["logs"]
+            ],
+        },
+    }
+
+
+def to_bsc_transaction(record: dict) -> BscTransaction:
+    receipt = dict(record["receipt"])
+    receipt["logs"] = [
+        {**log, "topics": [HexBytes(topic) for topic in log["topics"]]}
+        for log in receipt["logs"]
+    ]
+    return BscTransaction(
+        record["hash"],
+        receipt,
+        record["timeStamp"],
+        record["gasUsed"],
+        record["gasPrice"],
+    )
+
+
+class ReceiptCache:
+    def __init__(self, path: str, max_receipts: Optional[int] = None):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # one connection is shared by every worker thread
+        self.lock = threading.Lock()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS receipts ("
+            "hash TEXT PRIMARY KEY, block_number INTEGER, record BLOB)"
+        )
+        self.connection.commit()
+        # with max_receipts the receipts stored first are dropped beyond it
+        self.max_receipts = max_receipts
+        self.size = len(self)
+
+    def __contains__(self, tx_hash: str) -> bool:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM receipts WHERE hash = ?", (tx_hash.lower(),)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM receipts").fetchone()
+        return row[0]
+
+    def get(self, tx_hash: str) -> Optional[dict]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT record FROM receipts WHERE hash = ?", (tx_hash.lower(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, record: dict):
+        blob = zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+        tx_hash = record["hash"].lower()
+        with self.lock:
+            if self.max_receipts is not None:
+                exists = self.connection.execute(
+                    "SELECT 1 FROM receipts WHERE hash = ?", (tx_hash,)
+                ).fetchone()
+                if exists is None:
+                    self.size += 1
+            self.connection.execute(
+                "INSERT OR REPLACE INTO receipts VALUES (?, ?, ?)",
+                (tx_hash, record["receipt"]["blockNumber"], blob),
+            )
+            if self.max_receipts is not None and self.size > self.max_receipts:
+                self.connection.execute(
+                    "DELETE FROM receipts WHERE rowid IN "
+                    "(SELECT rowid FROM receipts ORDER BY rowid LIMIT ?)",
+                    (self.size - self.max_receipts,),
+                )
+                self.size = self.max_receipts
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,42 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+RECEIPT_WORKERS = 4
+
+
+class ReceiptFetcher:
+    def __init__(
+        self, fetch_receipt: Callable[[str], dict], workers: int = RECEIPT_WORKERS
+    ):
+        self.fetch_receipt = fetch_receipt
+        self.workers = workers
+        # the threads outlive a page so their keep-alive connections do too
+        self.executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        )
+
+    def fetch(self, tx_hashes: Iterable[str]) -> Iterator[dict]:
+        # receipts come back in input order, with at most 2 * workers
+        # requests in flight ahead of the one being consumed
+        if self.executor is None:
+            yield from map(self.fetch_receipt, tx_hashes)
+            return
+        pending: collections.deque = collections.deque()
+        for tx_hash in tx_hashes:
+            pending.append(self.executor.submit(self.fetch_receipt, tx_hash))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self) -> "ReceiptFetcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
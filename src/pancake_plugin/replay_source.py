@@ -0,0 +1,80 @@
+import gzip
+import io
+import json
+import mmap
+import os
+from typing import IO, Iterable, Iterator, Optional
+
+from senkalib.platform.bsc.bsc_transaction import BscTransaction
+
+from pancake_plugin.receipt_cache import to_bsc_transaction, to_record
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def open_dump(source: mmap.mmap) -> IO[bytes]:
+    # the compression is told by the magic bytes, not the file name
+    magic = source[:4]
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=source, mode="rb")
+    if magic == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "zstd dumps need zstandard, install it with `pip install zstandard`"
+            ) from e
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(source))
+    return source
+
+
+def parse_record(line: bytes) -> dict:
+    # either a receipt_cache record or
+    # {"header": <txlist entry>, "receipt": <transaction receipt>}
+    record = json.loads(line)
+    if "header" in record:
+        record = to_record(record["header"], record["receipt"])
+    return record
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    # one JSON document per line
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as file_dump, mmap.mmap(
+        file_dump.fileno(), 0, access=mmap.ACCESS_READ
+    ) as source:
+        lines = open_dump(source)
+        for line in iter(lines.readline, b""):
+            if line.strip():
+                yield parse_record(line)
+
+
+def iter_replay(
+    path: str, address: Optional[str] = None, startblock: int = 0
+) -> Iterator[BscTransaction]:
+    # like txlist, a dump of several wallets yields the transactions an
+    # address sent or received
+    address = address.lower() if address else None
+    for record in iter_records(path):
+        receipt = record["receipt"]
+        if address is not None and address not in (
+            (receipt["from"] or "").lower(),
+            (receipt["to"] or "").lower(),
+        ):
+            continue
+        if startblock > 0 and (receipt["blockNumber"] or 0) < startblock:
+            continue
+        yield to_bsc_transaction(record)
+
+
+def write_dump(path: str, records: Iterable[dict]) -> int:
+    count = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as file_dump:
+        for record in records:
+            file_dump.write(json.dumps(record, separators=(",", ":")))
+            file_dump.write("\n")
+            count += 1
+    return count
@@ -0,0 +1,48 @@
+import dataclasses
+import uuid
+from typing import Optional
+
+from senkalib.caaj_journal import CaajJournal
+
+from pancake_plugin.amount import format_amount
+
+# a rolled up reward is a trade of its own, not one of the harvests in it
+ROLLUP_UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "caaj://bsc/pancakeswap/reward")
+
+
+class RewardRollup:
+    def __init__(self):
+        # (day, pool id, uti, wallet) -> [total, harvests, last caaj, decimals]
+        self.rewards: dict[tuple, list] = {}
+
+    def add(self, pool_id: Optional[int], caaj: CaajJournal, value: int, decimals: int):
+        key = (caaj.executed_at[:10], pool_id, caaj.uti, caaj.caaj_to)
+        reward = self.rewards.get(key)
+        if reward is None:
+            self.rewards[key] = [value, 1, caaj, decimals]
+        else:
+            reward[0] += value
+            reward[1] += 1
+            reward[2] = caaj
+
+    def flush(self, day: Optional[str] = None) -> list[CaajJournal]:
+        # rewards of the days before the given one, every reward without it
+        caajs = []
+        for key in [key for key in self.rewards if day is None or key[0] < day]:
+            value, harvests, caaj, decimals = self.rewards.pop(key)
+            reward_day, pool_id, uti, wallet = key
+            caajs.append(
+                dataclasses.replace(
+                    caaj,
+                    trade_uuid=str(
+                        uuid.uuid5(
+                            ROLLUP_UUID_NAMESPACE,
+                            f"{reward_day}/{pool_id}/{uti}/{wallet.lower()}",
+                        )
+                    ),
+                    amount=format_amount(value, decimals),
+                    comment=f"pancakeswap reward, pool {pool_id}, {harvests} "
+                    + ("harvest" if harvests == 1 else "harvests"),
+                )
+            )
+        return caajs
@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+TOKEN_TABLE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "pancake_plugin"
+)
+TOKEN_TABLE_MAX_AGE = 3600
+
+
+class TokenTableSnapshot:
+    def __init__(
+        self,
+        url: str,
+        cache_dir: str = TOKEN_TABLE_CACHE_DIR,
+        max_age: int = TOKEN_TABLE_MAX_AGE,
+        timeout: int = 30,
+    ):
+        self.url = url
+        self.path = self.get_path(url, cache_dir)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.etag = None
+        self.last_modified = None
+        self.rows: list = []
+        self.index: dict = {}
+        # chain -> decimals() of a token on chain, for tokens the table has no
+        # decimals for. what they return is kept in the snapshot
+        self.decimals_lookups: dict[str, Callable[[str], Optional[int]]] = {}
+        self.looked_up_decimals: dict[str, Optional[int]] = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def get_path(cls, url: str, cache_dir: str = TOKEN_TABLE_CACHE_DIR) -> str:
+        return os.path.join(cache_dir, f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+    def load(self) -> bool:
+        snapshot = self.__read_snapshot()
+        if snapshot is not None:
+            self.__apply(snapshot)
+            if time.time() - os.path.getmtime(self.path) < self.max_age:
+                return False
+
+        # a fresh snapshot never reaches the network, nor imports its stack
+        import urllib.error
+        import urllib.request
+
+        request = urllib.request.Request(self.url)
+        if snapshot is not None and self.etag:
+            request.add_header("If-None-Match", self.etag)
+        if snapshot is not None and self.last_modified:
+            request.add_header("If-Modified-Since", self.last_modified)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read().decode()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if snapshot is None:
+                raise
+            # a 304 confirms the last snapshot, a server error keeps it
+            if e.code == 304:
+                os.utime(self.path)
+            return False
+        except urllib.error.URLError:
+            # keep working from the last snapshot while offline
+            if snapshot is not None:
+                return False
+            raise
+
+        snapshot = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "rows": list(csv.DictReader(content.strip().splitlines())),
+            "decimals": self.looked_up_decimals,
+        }
+        self.__write_snapshot(snapshot)
+        self.__apply(snapshot)
+        return True
+
+    @classmethod
+    def build_index(cls, content: str) -> dict:
+        return cls.index_rows(csv.DictReader(content.strip().splitlines()))
+
+    @classmethod
+    def index_rows(cls, rows) -> dict:
+        index: dict = {}
+        for row in rows:
+            key = (row["chain"], row["original_id"].lower())
+            index.setdefault(key, []).append(row)
+        return index
+
+    def get_all_meta_data(self, chain: str, token_original_id: str) -> Optional[dict]:
+        rows = self.index.get((chain, token_original_id.lower()))
+        if rows is None:
+            return None
+        elif len(rows) > 1:
+            raise ValueError(
+                f"token_original_id table have duplicated definition. token_original_id: {token_original_id}"
+            )
+        return rows[0]
+
+    def get_uti(self, chain: str, token_original_id: str) -> str:
+        meta_data = self.get_all_meta_data(chain, token_original_id)
+        if meta_data is None:
+            raise ValueError(f"unknown token_original_id is given: {token_original_id}")
+        return meta_data["uti"]
+
+    def get_decimals(self, chain: str, token_original_id: str) -> Optional[int]:
+        meta_data = self.get_all_meta_data(chain, token_original_id)
+        if meta_data is not None and meta_data.get("decimals"):
+            return int(meta_data["decimals"])
+        key = f"{chain}/{token_original_id.lower()}"
+        if key in self.looked_up_decimals:
+            return self.looked_up_decimals[key]
+        lookup = self.decimals_lookups.get(chain)
+        if lookup is None:
+            return None
+        decimals = lookup(token_original_id)
+        with self.lock:
+            self.looked_up_decimals[key] = decimals
+            # the table itself is no fresher for it, keep its age
+            mtime = os.path.getmtime(self.path)
+            self.__write_snapshot(
+                {
+                    "etag": self.etag,
+                    "last_modified": self.last_modified,
+                    "rows": self.rows,
+                    "decimals": self.looked_up_decimals,
+                }
+            )
+            os.utime(self.path, (mtime, mtime))
+        return decimals
+
+    def get_symbol(self, chain: str, token_original_id: str) -> Optional[str]:
+        meta_data = self.get_all_meta_data(chain, token_original_id)
+        if meta_data is None:
+            return None
+        return meta_data.get("symbol")
+
+    def __apply(self, snapshot: dict):
+        self.etag = snapshot["etag"]
+        self.last_modified = snapshot["last_modified"]
+        self.rows = snapshot["rows"]
+        self.index = self.index_rows(self.rows)
+        self.looked_up_decimals = snapshot.get("decimals") or {}
+
+    def __read_snapshot(self) -> Optional[dict]:
+        # plain json, a snapshot planted in the cache dir is only ever data
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_snapshot:
+                snapshot = json.load(file_snapshot)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("rows"), list):
+            return None
+        return snapshot
+
+    def __write_snapshot(self, snapshot: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file_snapshot:
+            json.dump(snapshot, file_snapshot)
+        os.replace(tmp_path, self.path)
+
+
+class MemoizedTokenTable:
+    def __init__(self, token_table):
+        self.token_table = token_table
+        # ids are folded to lower case only for a table that matches them so,
+        # the id memoized is always the id the table is asked for
+        self.fold_case = isinstance(token_table, TokenTableSnapshot)
+        self.utis: dict[tuple[str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.decimals: dict[tuple[str, str], Optional[int]] = {}
+
+    def get_key(self, chain: str, token_original_id: str) -> tuple[str, str]:
+        if self.fold_case:
+            return (chain, token_original_id.lower())
+        return (chain, token_original_id)
+
+    def get_uti(self, chain: str, token_original_id: str) -> str:
+        key = self.get_key(chain, token_original_id)
+        uti = self.utis.get(key)
+        if uti is None:
+            self.misses += 1
+            uti = self.token_table.get_uti(*key)
+            self.utis[key] = uti
+        else:
+            self.hits += 1
+        return uti
+
+    def get_decimals(self, chain: str, token_original_id: str) -> Optional[int]:
+        if not isinstance(self.token_table, TokenTableSnapshot):
+            return None
+        key = self.get_key(chain, token_original_id)
+        if key not in self.decimals:
+            self.decimals[key] = self.token_table.get_decimals(*key)
+        return self.decimals[key]
@@ -0,0 +1,193 @@
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+from pancake_plugin.pancake_plugin import ERC20_TRANSFER_TOPIC, PancakePlugin
+from pancake_plugin.receipt_cache import to_bsc_transaction, to_record
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+FIXTURES = {
+    "swap_bnb_to_cake": "swap",
+    "swap_cake_to_bnb": "swap",
+    "swap_cake_to_eth": "swap",
+    "liquidity_add_bnb_cake": "liquidity_add",
+    "liquidity_add_busd_eth": "liquidity_add",
+    "liquidity_remove_bnb_cake": "liquidity_remove",
+    "liquidity_remove_eth_busd": "liquidity_remove",
+    "stake_cake_bnb": "earn",
+    "unstake_cake_bnb": "earn",
+    "harvest_cake_bnb": "earn",
+    "harvest_busd_bnb": "earn",
+}
+SYNTHETIC_LOG_COUNTS = [10, 100, 1000]
+SYNTHETIC_FIXTURE = "swap_cake_to_eth"
+ROUNDS = 5
+# allowed slowdown / allocation growth against the baseline
+TOLERANCE = 0.2
+# time and allocated memory may grow at most twice as fast as the log count
+SCALING_LIMIT = 2
+# reference results of one machine, compared with --baseline only and
+# refreshed with --save test/benchmark_baseline.json
+BASELINE_PATH = "test/benchmark_baseline.json"
+
+
+class BenchmarkTokenTable:
+    def get_uti(self, chain: str, token_original_id: str) -> str:
+        return f"{token_original_id.lower()}/{chain}"
+
+
+def load_record(receipt_filename: str) -> dict:
+    with open("test/testdata/header.json", "r", encoding="utf-8") as file_header:
+        header = json.load(file_header)
+    with open(
+        f"test/testdata/transaction_receipt/{receipt_filename}.json",
+        "r",
+        encoding="utf-8",
+    ) as file_receipt:
+        receipt = json.load(file_receipt)
+    header["hash"] = receipt["transactionHash"]
+    return to_record(header, receipt)
+
+
+def pad_record(record: dict, log_count: int) -> dict:
+    # unrelated transfers in the middle of the receipt, as in routed swaps
+    record = copy.deepcopy(record)
+    logs = record["receipt"]["logs"]
+    padding = []
+    for i in range(max(log_count - len(logs), 0)):
+        padding.append(
+            {
+                "address": "0x55d398326f99059fF775485246999027B3197955",
+                "topics": [
+                    ERC20_TRANSFER_TOPIC,
+                    f"0x{i + 1:064x}",
+                    f"0x{i + 2:064x}",
+                ],
+                "data": f"0x{i + 1:064x}",
+                "logIndex": None,
+            }
+        )
+    middle = len(logs) // 2
+    record["receipt"]["logs"] = logs[:middle] + padding + logs[middle:]
+    return record
+
+
+def get_cases() -> dict:
+    cases = {}
+    for receipt_filename, branch in FIXTURES.items():
+        cases[receipt_filename] = (
+            branch,
+            to_bsc_transaction(load_record(receipt_filename)),
+        )
+    for log_count in SYNTHETIC_LOG_COUNTS:
+        record = pad_record(load_record(SYNTHETIC_FIXTURE), log_count)
+        cases[f"synthetic_{log_count}_logs"] = ("swap", to_bsc_transaction(record))
+    return cases
+
+
+def measure(transaction, iterations: int) -> dict:
+    token_table = BenchmarkTokenTable()
+    PancakePlugin.get_caajs(ADDRESS, transaction, token_table)
+
+    # the fastest of a few rounds, the others were slowed by something else
+    elapsed = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            PancakePlugin.get_caajs(ADDRESS, transaction, token_table)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    PancakePlugin.get_caajs(ADDRESS, transaction, token_table)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "tx_per_sec": iterations / elapsed,
+        "peak_bytes": peak_bytes,
+    }
+
+
+def run(iterations: int) -> dict:
+    results = {}
+    for name, (branch, transaction) in get_cases().items():
+        results[name] = {"branch": branch, **measure(transaction, iterations)}
+    return {
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "results": results,
+    }
+
+
+def check(report: dict, baseline: Optional[dict] = None) -> list[str]:
+    problems = []
+    results = report["results"]
+    for small, large in zip(SYNTHETIC_LOG_COUNTS, SYNTHETIC_LOG_COUNTS[1:]):
+        small_result = results[f"synthetic_{small}_logs"]
+        large_result = results[f"synthetic_{large}_logs"]
+        growth = large_result["peak_bytes"] / small_result["peak_bytes"]
+        if growth > SCALING_LIMIT * large / small:
+            problems.append(
+                f"allocated memory grows {growth:.1f}x from {small} to {large} logs"
+            )
+        slowdown = small_result["tx_per_sec"] / large_result["tx_per_sec"]
+        if slowdown > SCALING_LIMIT * large / small:
+            problems.append(
+                f"time per transaction grows {slowdown:.1f}x "
+                f"from {small} to {large} logs"
+            )
+
+    for name, result in results.items():
+        if baseline is None or name not in baseline["results"]:
+            continue
+        expected = baseline["results"][name]
+        if result["tx_per_sec"] < expected["tx_per_sec"] * (1 - TOLERANCE):
+            problems.append(
+                f"{name}: {result['tx_per_sec']:.0f} tx/s, "
+                f"baseline {expected['tx_per_sec']:.0f} tx/s"
+            )
+        if result["peak_bytes"] > expected["peak_bytes"] * (1 + TOLERANCE):
+            problems.append(
+                f"{name}: {result['peak_bytes']} bytes allocated, "
+                f"baseline {expected['peak_bytes']} bytes"
+            )
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PancakePlugin.get_caajs benchmark")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        nargs="?",
+        const=BASELINE_PATH,
+        help=f"baseline JSON to compare with, {BASELINE_PATH} without a path",
+    )
+    parser.add_argument("--save", type=str, help="write the results as a baseline")
+    args = parser.parse_args()
+
+    report = run(args.iterations)
+    for name, result in report["results"].items():
+        print(
+            f"{name:32} {result['branch']:18} {result['tx_per_sec']:>12.0f} tx/s"
+            f" {result['peak_bytes']:>10} bytes allocated"
+        )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_baseline:
+            baseline = json.load(file_baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file_baseline:
+            json.dump(report, file_baseline, indent=2)
+
+    problems = check(report, baseline)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
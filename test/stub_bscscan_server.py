@@ -0,0 +1,186 @@
+import collections
+import glob
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+TESTDATA_DIR = "test/testdata"
+
+
+def to_raw_receipt(receipt: dict) -> dict:
+    # eth_getTransactionReceipt returns quantities as hex and lower addresses
+    return {
+        **receipt,
+        "blockNumber": hex(receipt["blockNumber"]),
+        "status": hex(receipt["status"]),
+        "from": receipt["from"].lower(),
+        "to": receipt["to"].lower() if receipt["to"] else None,
+        "logs": [
+            {
+                **log,
+                "address": log["address"].lower(),
+                "logIndex": hex(log["logIndex"]),
+            }
+            for log in receipt["logs"]
+        ],
+    }
+
+
+def to_txlist_entry(header: dict, receipt: dict) -> dict:
+    return {
+        **header,
+        "hash": receipt["transactionHash"],
+        "blockNumber": str(receipt["blockNumber"]),
+        "from": receipt["from"].lower(),
+        "to": (receipt["to"] or "").lower(),
+        "gasUsed": str(receipt["gasUsed"]),
+        "isError": "0" if receipt["status"] == 1 else "1",
+    }
+
+
+class StubBscScanServer:
+    """Replays the testdata receipts as the BSCScan txlist and proxy api."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        testdata_dir: str = TESTDATA_DIR,
+        rate_limit: Optional[int] = None,
+        rate_limit_status: int = 200,
+    ):
+        self.latency = latency
+        # calls per second above which a call is refused, with a 429 or like
+        # bscscan with a 200 and a NOTOK result
+        self.rate_limit = rate_limit
+        self.rate_limit_status = rate_limit_status
+        self.calls: collections.deque = collections.deque()
+        self.rate_limited = 0
+        with open(f"{testdata_dir}/header.json", "r", encoding="utf-8") as file_header:
+            header = json.load(file_header)
+        self.receipts: dict[str, dict] = {}
+        self.txs: list[dict] = []
+        for path in sorted(glob.glob(f"{testdata_dir}/transaction_receipt/*.json")):
+            with open(path, "r", encoding="utf-8") as file_receipt:
+                receipt = json.load(file_receipt)
+            self.receipts[receipt["transactionHash"].lower()] = to_raw_receipt(receipt)
+            self.txs.append(to_txlist_entry(header, receipt))
+        self.txs.sort(key=lambda tx: int(tx["blockNumber"]))
+        # token address -> what its decimals() returns
+        self.decimals: dict[str, int] = {}
+
+        self.lock = threading.Lock()
+        self.requests: list[dict] = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.__get_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> "StubBscScanServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubBscScanServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def is_rate_limited(self) -> bool:
+        if self.rate_limit is None:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.calls and self.calls[0] <= now - 1:
+                self.calls.popleft()
+            if len(self.calls) >= self.rate_limit:
+                self.rate_limited += 1
+                return True
+            self.calls.append(now)
+            return False
+
+    def respond(self, params: dict) -> dict:
+        if params.get("action") == "eth_getTransactionReceipt":
+            receipt = self.receipts.get(params["txhash"].lower())
+            return {"jsonrpc": "2.0", "id": 1, "result": receipt}
+        if params.get("action") == "eth_call" and params.get("data") == "0x313ce567":
+            decimals = self.decimals.get(params["to"].lower())
+            if decimals is None:
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x"}
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x%064x" % decimals}
+        if params.get("action") == "txlist":
+            address = params["address"].lower()
+            page, offset = int(params["page"]), int(params["offset"])
+            txs = [
+                tx
+                for tx in self.txs
+                if address in (tx["from"], tx["to"])
+                and int(params["startblock"])
+                <= int(tx["blockNumber"])
+                <= int(params["endblock"])
+            ][(page - 1) * offset : page * offset]
+            if not txs:
+                return {"status": "0", "message": "No transactions found", "result": []}
+            return {"status": "1", "message": "OK", "result": txs}
+        return {"status": "0", "message": "NOTOK", "result": "Error! Unknown action"}
+
+    def __get_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                params = dict(
+                    urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query)
+                )
+                with stub.lock:
+                    stub.requests.append(params)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                status = 200
+                try:
+                    time.sleep(stub.latency)
+                    if stub.is_rate_limited():
+                        status = stub.rate_limit_status
+                        response = {
+                            "status": "0",
+                            "message": "NOTOK",
+                            "result": "Max rate limit reached",
+                        }
+                    else:
+                        response = stub.respond(params)
+                    body = json.dumps(response).encode()
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,112 @@
+import csv
+import json
+import tempfile
+import unittest
+from decimal import Decimal
+from test import test_pancake_plugin
+from unittest.mock import MagicMock, call, patch
+
+from pancake_plugin.amount import decode_uint256, format_amount
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.token_table import MemoizedTokenTable, TokenTableSnapshot
+
+TOKEN_TABLE_CSV = """uti,chain,original_id,symbol,decimals
+bnb/bsc,bsc,0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c,bnb,18
+cake/bsc,bsc,0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82,cake,
+eth/ethereum,bsc,0x2170Ed0880ac9A755fd29B2688956BD959F933F8,eth,18
+"""
+WBNB = "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c"
+CAKE = "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82"
+ETH = "0x2170Ed0880ac9A755fd29B2688956BD959F933F8"
+DOGE = "0xbA2aE424d960c26247Dd6c32edC70B295c744C43"
+URL = "https://example.com/token_original_id.csv"
+
+
+class TestAmount(unittest.TestCase):
+    def test_decode_uint256(self):
+        assert (
+            decode_uint256(
+                "0x00000000000000000000000000000000000000000000000006f05b59d3b20000"
+            )
+            == 500000000000000000
+        )
+
+    def test_format_amount(self):
+        for value in [
+            0,
+            1,
+            5 * 10**17,
+            10**18,
+            10**20,
+            21562948714728883817,
+            10**46,
+            10**47,
+            2**256 - 1,
+        ]:
+            for decimals in [0, 6, 8, 18]:
+                assert format_amount(value, decimals) == str(
+                    Decimal(value) / Decimal(10**decimals)
+                )
+        assert format_amount(1) == "1E-18"
+        assert format_amount(1500000, 6) == "1.5"
+
+    def load_snapshot(self, tmpdir):
+        # a fresh snapshot on disk, loaded without a request
+        with open(
+            TokenTableSnapshot.get_path(URL, tmpdir), "w", encoding="utf-8"
+        ) as file_snapshot:
+            json.dump(
+                {
+                    "etag": None,
+                    "last_modified": None,
+                    "rows": list(csv.DictReader(TOKEN_TABLE_CSV.splitlines())),
+                },
+                file_snapshot,
+            )
+        return TokenTableSnapshot(URL, tmpdir)
+
+    def test_get_caajs_with_decimals(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            token_table = MemoizedTokenTable(self.load_snapshot(tmpdir))
+            assert token_table.get_decimals("bsc", WBNB) == 18
+            assert token_table.get_decimals("bsc", CAKE) is None
+            assert PancakePlugin.get_decimals(token_table, CAKE) == 18
+            assert PancakePlugin.get_decimals(token_table, ETH) == 18
+        mock = test_pancake_plugin.TestPancakePlugin.get_token_table_mock()
+        assert PancakePlugin.get_decimals(mock, ETH) == 18
+
+        transaction = test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+            "header", "swap_cake_to_eth"
+        )
+        with patch.object(PancakePlugin, "_get_uuid", return_value="uuid"):
+            caajs = PancakePlugin.get_caajs(
+                "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, token_table
+            )
+        assert [(caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("1", "cake/bsc"),
+            ("0.003189165151348716", "eth/ethereum"),
+            ("0.00067182", "bnb/bsc"),
+        ]
+
+    def test_lookup_decimals(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            snapshot = self.load_snapshot(tmpdir)
+            lookup = MagicMock(
+                side_effect=lambda address: {DOGE.lower(): 8}.get(address)
+            )
+            snapshot.decimals_lookups["bsc"] = lookup
+            token_table = MemoizedTokenTable(snapshot)
+            assert PancakePlugin.get_decimals(token_table, DOGE) == 8
+            assert PancakePlugin.get_decimals(token_table, CAKE) == 18
+            # decimals in the table are not looked up
+            assert PancakePlugin.get_decimals(token_table, WBNB) == 18
+            assert lookup.call_args_list == [call(DOGE.lower()), call(CAKE.lower())]
+
+            # looked up decimals are kept with the snapshot
+            snapshot = TokenTableSnapshot(URL, tmpdir)
+            assert snapshot.get_decimals("bsc", DOGE.lower()) == 8
+            assert snapshot.get_decimals("bsc", CAKE) is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import dataclasses
+import decimal
+import os
+import tempfile
+import unittest
+from test import test_caaj_writer
+
+from pancake_plugin.arrow_writer import to_arrow_table, write_dataset
+from pancake_plugin.journal_buffer import JournalBuffer
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+except ImportError:
+    pyarrow = None
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestArrowWriter(unittest.TestCase):
+    @classmethod
+    def get_journals(cls) -> JournalBuffer:
+        caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs(100, 5)
+        caajs[-1] = dataclasses.replace(
+            caajs[-1], executed_at="2022-01-01 00:00:00", amount="1E-18"
+        )
+        return JournalBuffer(caajs)
+
+    def test_to_arrow_table(self):
+        journals = self.get_journals()
+        table = to_arrow_table(journals, ADDRESS)
+        assert table.column_names[:12] == list(journals.columns)
+        assert table.schema.field("executed_at").type == pyarrow.timestamp("s")
+        assert table.schema.field("amount").type == pyarrow.decimal256(76, 18)
+        assert pyarrow.types.is_dictionary(table.schema.field("uti").type)
+        assert table["amount"][99].as_py() == decimal.Decimal("1E-18")
+        assert table["amount"][0].as_py() == decimal.Decimal(
+            journals.get_column("amount")[0]
+        )
+        assert set(table["address"].to_pylist()) == {ADDRESS}
+        assert table["amount_exact"].to_pylist() == journals.get_column("amount")
+
+    def test_to_arrow_table_amounts(self):
+        amounts = [
+            "123456789012345678901.5",
+            "1.0000000000000000000000000000E+28",
+            "115792089237316195423570985008687907853269984665.640564039457584007",
+            "1E-19",
+            "115792089237316195423570985008687907853269984665640564039457584007913"
+            "129639935",
+        ]
+        caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs(len(amounts), 0)
+        journals = JournalBuffer(
+            dataclasses.replace(caaj, amount=amount)
+            for caaj, amount in zip(caajs, amounts)
+        )
+        table = to_arrow_table(journals)
+        # amounts beyond the decimal type are null there, exact as text
+        assert table["amount"].to_pylist() == [
+            decimal.Decimal(amount) for amount in amounts[:3]
+        ] + [None, None]
+        assert table["amount_exact"].to_pylist() == amounts
+
+    def test_write_dataset(self):
+        journals = self.get_journals()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_dataset(journals, tmpdir, "parquet", ["address", "month"], ADDRESS)
+            write_dataset(journals, tmpdir, "parquet", ["address", "month"], "0x1")
+            assert sorted(os.listdir(os.path.join(tmpdir, f"address={ADDRESS}"))) == [
+                "month=2021-12",
+                "month=2022-01",
+            ]
+            dataset = pyarrow.dataset.dataset(
+                tmpdir, format="parquet", partitioning="hive"
+            )
+            table = dataset.to_table(
+                columns=["amount", "uti"],
+                filter=(pyarrow.dataset.field("address") == ADDRESS)
+                & (pyarrow.dataset.field("month") == "2021-12"),
+            )
+            assert table.num_rows == 99
+            assert dataset.count_rows() == 200
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_dataset(journals, tmpdir, "arrow")
+            dataset = pyarrow.dataset.dataset(tmpdir, format="ipc")
+            table = dataset.to_table()
+            assert table.column_names == list(journals.columns) + ["amount_exact"]
+            executed_at = [str(value) for value in table["executed_at"].to_pylist()]
+            assert executed_at == sorted(journals.get_column("executed_at"))
+
+        with self.assertRaises(ValueError):
+            write_dataset(journals, tmpdir, "parquet", ["address"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import copy
+import json
+import unittest
+from test import benchmark_pancake_plugin
+
+
+class TestBenchmarkPancakePlugin(unittest.TestCase):
+    def test_pad_record(self):
+        record = benchmark_pancake_plugin.load_record("swap_cake_to_eth")
+        padded = benchmark_pancake_plugin.pad_record(record, 100)
+        assert len(padded["receipt"]["logs"]) == 100
+        assert len(record["receipt"]["logs"]) == 5
+
+    @classmethod
+    def get_report(cls, tx_per_sec: float = 1000.0, peak_bytes: int = 1000) -> dict:
+        # a report scaling exactly linearly with the log count
+        results = {
+            name: {"tx_per_sec": tx_per_sec, "peak_bytes": peak_bytes}
+            for name in benchmark_pancake_plugin.FIXTURES
+        }
+        for count in benchmark_pancake_plugin.SYNTHETIC_LOG_COUNTS:
+            results[f"synthetic_{count}_logs"] = {
+                "tx_per_sec": tx_per_sec * 10 / count,
+                "peak_bytes": peak_bytes * count // 10,
+            }
+        return {"results": results}
+
+    def test_run(self):
+        # throughput depends on the machine, only the shape is checked here
+        report = benchmark_pancake_plugin.run(2)
+        assert set(report["results"]) == set(benchmark_pancake_plugin.get_cases())
+        for result in report["results"].values():
+            assert result["tx_per_sec"] > 0
+            assert result["peak_bytes"] > 0
+
+    def test_check(self):
+        report = self.get_report()
+        assert benchmark_pancake_plugin.check(report) == []
+
+        baseline = copy.deepcopy(report)
+        baseline["results"]["swap_bnb_to_cake"]["tx_per_sec"] *= 10
+        baseline["results"]["swap_cake_to_bnb"]["peak_bytes"] //= 10
+        problems = benchmark_pancake_plugin.check(report, baseline)
+        assert len(problems) == 2
+        assert problems[0].startswith("swap_bnb_to_cake: ")
+        assert problems[1].startswith("swap_cake_to_bnb: ")
+        # within the tolerance of the baseline
+        assert (
+            benchmark_pancake_plugin.check(
+                self.get_report(tx_per_sec=900.0, peak_bytes=1100), report
+            )
+            == []
+        )
+
+        report["results"]["synthetic_1000_logs"]["peak_bytes"] *= 10
+        assert len(benchmark_pancake_plugin.check(report)) == 1
+        report["results"]["synthetic_1000_logs"]["tx_per_sec"] /= 100
+        problems = benchmark_pancake_plugin.check(report)
+        assert len(problems) == 2
+        assert problems[1].startswith("time per transaction grows")
+
+    def test_baseline(self):
+        with open(
+            benchmark_pancake_plugin.BASELINE_PATH, "r", encoding="utf-8"
+        ) as file_baseline:
+            baseline = json.load(file_baseline)
+        assert set(baseline["results"]) == set(benchmark_pancake_plugin.get_cases())
+        # the baseline itself scales linearly
+        assert benchmark_pancake_plugin.check(baseline) == []
+
+
+if __name__ == "__main__":
+    unittest.main()
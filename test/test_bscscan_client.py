@@ -0,0 +1,162 @@
+import json
+import unittest
+from test import test_pancake_plugin
+from test.stub_bscscan_server import StubBscScanServer
+
+from pancake_plugin.bscscan_client import BscScanClient, BscScanError
+
+
+class FakeBscScanClient(BscScanClient):
+    def __init__(self, txs: list):
+        super().__init__("key")
+        self.txs = txs
+        self.requests: list = []
+
+    def get_txs(self, address, startblock=0, endblock=99999999, page=1, offset=10000):
+        self.requests.append((startblock, page))
+        # bscscan's result window
+        assert page * offset <= 10000
+        txs = [tx for tx in self.txs if int(tx["blockNumber"]) >= startblock]
+        return txs[(page - 1) * offset : page * offset]
+
+
+class TestBscScanClient(unittest.TestCase):
+    def test_normalize_receipt(self):
+        transaction = test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+            "header", "swap_bnb_to_cake"
+        )
+        with open(
+            "test/testdata/transaction_receipt/swap_bnb_to_cake.json",
+            "r",
+            encoding="utf-8",
+        ) as file_receipt:
+            raw_receipt = json.load(file_receipt)
+        # eth_getTransactionReceipt returns quantities as hex and lower addresses
+        raw_receipt["from"] = raw_receipt["from"].lower()
+        raw_receipt["to"] = raw_receipt["to"].lower()
+        raw_receipt["blockNumber"] = hex(raw_receipt["blockNumber"])
+        raw_receipt["status"] = hex(raw_receipt["status"])
+        for log in raw_receipt["logs"]:
+            log["address"] = log["address"].lower()
+            log["logIndex"] = hex(log["logIndex"])
+
+        receipt = BscScanClient.normalize_receipt(raw_receipt)
+        expected = transaction.transaction_receipt
+        assert receipt["from"] == expected["from"]
+        assert receipt["to"] == expected["to"]
+        assert receipt["blockNumber"] == expected["blockNumber"]
+        assert receipt["status"] == 1
+        assert len(receipt["logs"]) == len(expected["logs"])
+        for log, expected_log in zip(receipt["logs"], expected["logs"]):
+            assert log["address"] == expected_log["address"]
+            assert log["topics"] == expected_log["topics"]
+            assert log["data"] == expected_log["data"]
+            assert log["logIndex"] == expected_log["logIndex"]
+
+    def test_iter_tx_pages(self):
+        txs = [
+            {"hash": f"0x{i}", "blockNumber": str(block)}
+            for i, block in enumerate([1, 2, 2, 3, 3, 3, 3, 3, 4, 5])
+        ]
+        client = FakeBscScanClient(txs)
+        pages = list(client.iter_tx_pages("0xabc", page_size=3))
+        assert [tx["hash"] for page in pages for tx in page] == [
+            tx["hash"] for tx in txs
+        ]
+        assert max(len(page) for page in pages) <= 3
+        assert client.requests == [(0, 1), (2, 1), (3, 1), (3, 2), (4, 1)]
+
+        client = FakeBscScanClient(
+            [{"hash": f"0x{i}", "blockNumber": "7"} for i in range(10001)]
+        )
+        with self.assertRaises(BscScanError):
+            list(client.iter_tx_pages("0xabc", page_size=5000))
+        client = FakeBscScanClient(txs)
+        assert len(list(client.iter_tx_pages("0xabc", startblock=3))) == 1
+
+    def test_get_transactions(self):
+        transaction = test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+            "header", "swap_bnb_to_cake"
+        )
+        receipt = transaction.transaction_receipt
+        txs = [
+            {
+                "hash": receipt["transactionHash"],
+                "blockNumber": str(receipt["blockNumber"]),
+                "timeStamp": "1640654932",
+                "gasUsed": "134364",
+                "gasPrice": "5000000000",
+                "isError": "0",
+                "to": to,
+            }
+            for to in [receipt["to"], "0xA39Af17CE4a8eb807E076805Da1e2B8EA7D0755b"]
+        ]
+        client = FakeBscScanClient(txs)
+        client.get_transaction_receipt = lambda tx_hash: receipt
+        transactions = list(
+            client.get_transactions(
+                "0xabc", tx_filter=lambda to_addresses: [True, False], page_size=2
+            )
+        )
+        assert len(transactions) == 1
+        assert (
+            transactions[0].get_transaction_fee() == transaction.get_transaction_fee()
+        )
+
+    def test_get_transactions_seen(self):
+        # the router takes part in every swap of the wallet
+        addresses = [
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+            "0x10ED43C718714eb63d5aA57B78B54704E256024E",
+        ]
+        with StubBscScanServer() as stub:
+            client = BscScanClient("key", url=stub.url)
+            seen: set = set()
+            transactions = [
+                transaction
+                for address in addresses
+                for transaction in client.get_transactions(address, seen=seen)
+            ]
+            client.close()
+        hashes = [
+            transaction.get_transaction_id().lower() for transaction in transactions
+        ]
+        assert len(hashes) == len(set(hashes)) == len(seen) == 13
+        receipt_requests = [
+            request
+            for request in stub.requests
+            if request["action"] == "eth_getTransactionReceipt"
+        ]
+        assert len(receipt_requests) == 13
+
+    def test_get_token_decimals(self):
+        with StubBscScanServer() as stub:
+            stub.decimals["0xba2ae424d960c26247dd6c32edc70b295c744c43"] = 8
+            client = BscScanClient("key", url=stub.url)
+            assert (
+                client.get_token_decimals("0xbA2aE424d960c26247Dd6c32edC70B295c744C43")
+                == 8
+            )
+            # a contract without decimals()
+            assert client.get_token_decimals("0x0") is None
+            client.close()
+
+    def test_close(self):
+        with StubBscScanServer() as stub:
+            client = BscScanClient("key", url=stub.url)
+            transactions = list(
+                client.get_transactions(
+                    "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", workers=4
+                )
+            )
+            assert len(transactions) == 13
+            connections = list(client.connections)
+            assert len(connections) > 1
+            # closed from this thread, the connections of the workers as well
+            client.close()
+            assert client.connections == set()
+            assert all(connection.sock is None for connection in connections)
+
+
+if __name__ == "__main__":
+    unittest.main()
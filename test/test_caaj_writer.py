@@ -0,0 +1,95 @@
+import io
+import random
+import unittest
+
+import pandas as pd
+from senkalib.caaj_journal import CaajJournal
+
+from pancake_plugin.caaj_writer import SortedCaajWriter
+
+
+class TestSortedCaajWriter(unittest.TestCase):
+    @classmethod
+    def get_caajs(cls, count: int, disorder: int) -> list:
+        random.seed(count + disorder)
+        caajs = []
+        for i in range(count):
+            second = max(i + random.randint(-disorder, disorder), 0)
+            caajs.append(
+                CaajJournal(
+                    f"2021-12-28 {second // 3600:02}:{second // 60 % 60:02}:{second % 60:02}",
+                    "bsc",
+                    "pancakeswap",
+                    "swap",
+                    f"0x{i:064x}",
+                    f"uuid-{i}",
+                    random.choice(["get", "lose"]),
+                    str(random.randint(1, 10**20) / 10**18),
+                    "cake/bsc",
+                    "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+                    "0x10ED43C718714eb63d5aA57B78B54704E256024E",
+                    'pancakeswap "swap", test' if i % 7 == 0 else "pancakeswap swap",
+                )
+            )
+        return caajs
+
+    @classmethod
+    def get_expected_csv(cls, caajs: list) -> str:
+        df = pd.DataFrame(caajs)
+        df = df.sort_values("executed_at", kind="stable")
+        return df.to_csv(None, index=False)
+
+    @classmethod
+    def get_written_csv(cls, caajs: list, window: int) -> str:
+        stream = io.StringIO()
+        writer = SortedCaajWriter(stream, window=window)
+        for caaj in caajs:
+            writer.write(caaj)
+        writer.close()
+        return stream.getvalue()
+
+    def test_in_memory(self):
+        caajs = self.get_caajs(500, 20)
+        assert self.get_written_csv(caajs, 1000) == self.get_expected_csv(caajs)
+
+    def test_spill_single_run(self):
+        caajs = self.get_caajs(500, 5)
+        writer = SortedCaajWriter(io.StringIO(), window=50)
+        for caaj in caajs:
+            writer.write(caaj)
+        assert len(writer.runs) == 1
+        assert self.get_written_csv(caajs, 50) == self.get_expected_csv(caajs)
+
+    def test_spill_many_runs(self):
+        caajs = self.get_caajs(500, 500)
+        writer = SortedCaajWriter(io.StringIO(), window=10)
+        for caaj in caajs:
+            writer.write(caaj)
+        assert len(writer.runs) > 1
+        assert self.get_written_csv(caajs, 10) == self.get_expected_csv(caajs)
+
+    def test_empty(self):
+        assert (
+            self.get_written_csv([], 10)
+            == ",".join(
+                [
+                    "executed_at",
+                    "platform",
+                    "application",
+                    "service",
+                    "transaction_id",
+                    "trade_uuid",
+                    "type",
+                    "amount",
+                    "uti",
+                    "caaj_from",
+                    "caaj_to",
+                    "comment",
+                ]
+            )
+            + "\n"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
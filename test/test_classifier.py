@@ -0,0 +1,56 @@
+import unittest
+
+from pancake_plugin.classifier import EventClassifier
+from pancake_plugin.pancake_plugin import (
+    CLASSIFIER_RULES,
+    ERC20_BURN_TOPIC_BYTES,
+    ERC20_MINT_TOPIC_BYTES,
+    ERC20_TRANSFER_TOPIC_BYTES,
+    WETH_EARN_WITHDRAWAL_TOPIC_BYTES,
+)
+
+TRADE = bytes.fromhex("10ed43c718714eb63d5aa57b78b54704e256024e")
+EARN = bytes.fromhex("73feaa1ee314f8c655e354234017be2193c9e24e")
+
+
+class TestEventClassifier(unittest.TestCase):
+    def test_classify(self):
+        classifier = EventClassifier(CLASSIFIER_RULES)
+        assert classifier.classify(TRADE, {ERC20_TRANSFER_TOPIC_BYTES}) == "swap"
+        assert classifier.classify(TRADE, {ERC20_MINT_TOPIC_BYTES}) == "liquidity_add"
+        assert (
+            classifier.classify(TRADE, {ERC20_BURN_TOPIC_BYTES}) == "liquidity_remove"
+        )
+        # burn is listed first
+        assert (
+            classifier.classify(TRADE, {ERC20_BURN_TOPIC_BYTES, ERC20_MINT_TOPIC_BYTES})
+            == "liquidity_remove"
+        )
+        assert (
+            classifier.classify(EARN, {WETH_EARN_WITHDRAWAL_TOPIC_BYTES})
+            == "earn_unstake"
+        )
+        assert classifier.classify(EARN, {ERC20_MINT_TOPIC_BYTES}) == "earn_stake"
+        assert classifier.classify(bytes(20), {ERC20_TRANSFER_TOPIC_BYTES}) is None
+
+    def test_table(self):
+        classifier = EventClassifier(
+            [
+                (b"\xa0", [b"\x01", b"\x02"], "both"),
+                (b"\xa0", [b"\x02"], "second"),
+                (b"\xb0", [b"\x03"], "third"),
+            ]
+        )
+        assert classifier.topic_bits == {b"\x01": 1, b"\x02": 2, b"\x03": 4}
+        assert classifier.table == {
+            (b"\xa0", 3): "both",
+            (b"\xa0", 2): "second",
+            (b"\xb0", 4): "third",
+        }
+        assert classifier.classify(b"\xa0", [b"\x01"]) is None
+        assert classifier.classify(b"\xa0", [b"\x01", b"\x02", b"\x03"]) == "both"
+        assert classifier.get_mask([b"\x03", b"\x04", b"\x01"]) == 5
+
+
+if __name__ == "__main__":
+    unittest.main()
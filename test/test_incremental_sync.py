@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from test import test_pancake_plugin
+from unittest.mock import patch
+
+from pancake_plugin.incremental_sync import SyncCursor, sync_address
+from pancake_plugin.pancake_plugin import PancakePlugin
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+OTHER = "0x0000000000000000000000000000000000000001"
+
+
+class TestIncrementalSync(unittest.TestCase):
+    @classmethod
+    def get_transactions(cls):
+        return [
+            test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+                "header", receipt_filename
+            )
+            for receipt_filename in [
+                "swap_bnb_to_cake",
+                "swap_cake_to_bnb",
+                "swap_cake_to_eth",
+                "approve",
+            ]
+        ]
+
+    def sync(self, transactions, output_path, cursor, batch_size=1, address=ADDRESS):
+        mock = test_pancake_plugin.TestPancakePlugin.get_token_table_mock()
+        with patch.object(PancakePlugin, "_get_uuid", return_value="uuid"):
+            return sync_address(
+                address, transactions, mock, output_path, cursor, batch_size
+            )
+
+    def read(self, path):
+        with open(path, "r", encoding="utf-8") as file_output:
+            return file_output.read()
+
+    def test_sync_cursor(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "result.csv")
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            assert cursor.load(output_path) is None
+            assert cursor.get_block(output_path, ADDRESS) == -1
+            cursor.commit(output_path, ADDRESS, 13856363, 120)
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            assert cursor.load(output_path) == {
+                "blocks": {ADDRESS.lower(): 13856363},
+                "offset": 120,
+            }
+            assert cursor.get_block(output_path, ADDRESS.lower()) == 13856363
+            # another output has a cursor of its own
+            assert cursor.load(os.path.join(tmpdir, "other.csv")) is None
+
+    def test_sync_address(self):
+        transactions = self.get_transactions()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            expected_path = os.path.join(tmpdir, "expected.csv")
+            assert (
+                self.sync(
+                    transactions,
+                    expected_path,
+                    SyncCursor(os.path.join(tmpdir, "expected")),
+                    batch_size=10,
+                )
+                == 9
+            )
+            expected = self.read(expected_path)
+            assert expected.startswith("executed_at,platform,")
+            assert len(expected.splitlines()) == 10
+
+            output_path = os.path.join(tmpdir, "result.csv")
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            assert self.sync(transactions[:2], output_path, cursor) == 6
+            assert cursor.get_block(output_path, ADDRESS) == 13856872
+            # already journaled transactions are skipped
+            assert self.sync(transactions, output_path, cursor) == 3
+            assert cursor.get_block(output_path, ADDRESS) == 14462952
+            assert self.sync(transactions, output_path, cursor) == 0
+            assert self.read(output_path) == expected
+
+    def test_sync_address_resume(self):
+        transactions = self.get_transactions()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            expected_path = os.path.join(tmpdir, "expected.csv")
+            self.sync(
+                transactions, expected_path, SyncCursor(os.path.join(tmpdir, "e"))
+            )
+
+            output_path = os.path.join(tmpdir, "result.csv")
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            self.sync(transactions[:1], output_path, cursor)
+            # a run killed after writing journals but before committing its cursor
+            with open(output_path, "a", encoding="utf-8") as file_output:
+                file_output.write("2021-12-28 01:28:52,bsc,pancakeswap,swap,0x")
+            self.sync(transactions, output_path, cursor)
+            assert self.read(output_path) == self.read(expected_path)
+
+    def test_sync_address_shared_output(self):
+        transactions = self.get_transactions()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "result.csv")
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            assert self.sync(transactions[:2], output_path, cursor) == 6
+            assert self.sync(transactions[:1], output_path, cursor, address=OTHER) == 3
+            # the first address resumes after the rows of the second
+            assert self.sync(transactions, output_path, cursor) == 3
+            assert self.sync(transactions, output_path, cursor, address=OTHER) == 6
+            assert len(self.read(output_path).splitlines()) == 1 + 6 + 3 + 3 + 6
+
+    def test_sync_address_existing_output(self):
+        transactions = self.get_transactions()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "result.csv")
+            with open(output_path, "w", encoding="utf-8") as file_output:
+                file_output.write("journals written without a cursor\n")
+            cursor = SyncCursor(os.path.join(tmpdir, "state"))
+            with self.assertRaises(ValueError):
+                self.sync(transactions, output_path, cursor)
+            assert self.read(output_path) == "journals written without a cursor\n"
+
+
+if __name__ == "__main__":
+    unittest.main()
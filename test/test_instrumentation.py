@@ -0,0 +1,91 @@
+import json
+import unittest
+from test import benchmark_pancake_plugin
+
+from pancake_plugin.instrumentation import Histogram, Instrumentation
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.receipt_cache import to_bsc_transaction
+
+
+class TestInstrumentation(unittest.TestCase):
+    def tearDown(self):
+        PancakePlugin.instrumentation = None
+
+    def test_histogram(self):
+        histogram = Histogram([0.001, 0.01])
+        for value in [0.0005, 0.001, 0.005, 0.5]:
+            histogram.observe(value)
+        assert histogram.to_dict()["buckets"] == {"0.001": 2, "0.01": 3, "+Inf": 4}
+        assert histogram.count == 4
+
+    def test_slow_transactions(self):
+        instrumentation = Instrumentation(slow_seconds=0.1, slow_samples=2)
+        for i, seconds in enumerate([0.05, 0.2, 0.3, 0.15, 0.4]):
+            instrumentation.observe("swap", seconds, f"0x{i}")
+        slow_transactions = instrumentation.to_dict()["slow_transactions"]
+        assert [sample["transaction_id"] for sample in slow_transactions] == [
+            "0x4",
+            "0x2",
+        ]
+        assert instrumentation.to_dict()["branches"] == {"swap": 5}
+
+    def test_get_caajs(self):
+        PancakePlugin.instrumentation = Instrumentation(slow_seconds=0)
+        for receipt_filename in [
+            "swap_bnb_to_cake",
+            "swap_cake_to_eth",
+            "liquidity_add_bnb_cake",
+            "liquidity_remove_bnb_cake",
+            "stake_cake_bnb",
+            "transaction_fail",
+        ]:
+            transaction = to_bsc_transaction(
+                benchmark_pancake_plugin.load_record(receipt_filename)
+            )
+            PancakePlugin.get_caajs(
+                benchmark_pancake_plugin.ADDRESS,
+                transaction,
+                benchmark_pancake_plugin.BenchmarkTokenTable(),
+            )
+
+        metrics = PancakePlugin.instrumentation.to_dict()
+        assert metrics["branches"] == {
+            "swap": 2,
+            "liquidity_add": 1,
+            "liquidity_remove": 1,
+            "earn_stake": 1,
+            "failed": 1,
+        }
+        assert metrics["latency_seconds"]["swap"]["count"] == 2
+        assert len(metrics["slow_transactions"]) == 6
+
+    def test_export(self):
+        instrumentation = Instrumentation()
+        instrumentation.observe("swap", 0.002, "0x1")
+        instrumentation.observe_token_lookups(3, 1)
+        instrumentation.observe_api_calls(
+            {"calls": 7, "retries": 2, "rate_limited": 2, "coalesced": 1, "budget": 9}
+        )
+        metrics = json.loads(instrumentation.to_json())
+        assert metrics["token_lookups"] == {"hit": 3, "miss": 1}
+        assert metrics["api_calls"]["calls"] == 7
+        assert "budget" not in metrics["api_calls"]
+        assert metrics["latency_seconds"]["swap"]["buckets"]["0.0025"] == 1
+        assert metrics["slow_transactions"] == []
+
+        prometheus = instrumentation.to_prometheus().splitlines()
+        assert 'pancake_plugin_transactions_total{branch="swap"} 1' in prometheus
+        assert (
+            'pancake_plugin_get_caajs_seconds_bucket{branch="swap",le="0.001"} 0'
+            in prometheus
+        )
+        assert (
+            'pancake_plugin_get_caajs_seconds_bucket{branch="swap",le="+Inf"} 1'
+            in prometheus
+        )
+        assert 'pancake_plugin_token_lookups_total{result="hit"} 3' in prometheus
+        assert 'pancake_plugin_api_calls_total{kind="retries"} 2' in prometheus
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import dataclasses
+import io
+import tracemalloc
+import unittest
+from test import test_caaj_writer
+
+from pancake_plugin.journal_buffer import (
+    CODECS,
+    DictionaryColumn,
+    JournalBuffer,
+    PackedColumn,
+)
+
+
+class TestJournalBuffer(unittest.TestCase):
+    def test_columns(self):
+        column = DictionaryColumn()
+        for i in range(300):
+            column.append(str(i % 260))
+        assert column.codes.typecode == "H"
+        assert column[259] == "259" and column[260] == "0"
+        assert len(column.values) == 260
+
+        column = PackedColumn(deduplicate=True)
+        for value in ["0xa", "0xa", "0xb", "0xa"]:
+            column.append(value)
+        assert [column[i] for i in range(len(column))] == ["0xa", "0xa", "0xb", "0xa"]
+        assert column.data == bytearray(b"0xa0xb0xa")
+        assert column[-1] == "0xa"
+
+        # hashes and uuids are kept as raw bytes, anything else as text
+        transaction_id = "0x" + "ae40de844d1c26be96db829ff0344e96" * 2
+        trade_uuid = "0c4d1a8e-4f5b-4a1e-9d1c-2b6f3e7a8c90"
+        for codec, values, raw_size in [
+            (CODECS["transaction_id"], [transaction_id, "0x1", "0xAB"], 33),
+            (CODECS["trade_uuid"], [trade_uuid, "uuid", trade_uuid.upper()], 17),
+        ]:
+            column = PackedColumn(codec=codec)
+            for value in values:
+                column.append(value)
+            assert [column[i] for i in range(len(column))] == values
+            assert column.offsets[1] == raw_size
+
+        column = PackedColumn()
+        column.append("1" * 300)
+        assert column.offsets.typecode == "H"
+        assert column[0] == "1" * 300
+        with self.assertRaises(IndexError):
+            column[1]
+
+    def test_caajs(self):
+        caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs(500, 20)
+        caajs[3] = dataclasses.replace(caajs[3], caaj_to=None)
+        journals = JournalBuffer(caajs)
+        assert len(journals) == 500
+        assert list(journals.iter_caajs()) == caajs
+        assert journals.get_column("uti") == ["cake/bsc"] * 500
+
+    def test_write_csv(self):
+        caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs(500, 20)
+        stream = io.StringIO()
+        JournalBuffer(caajs).write_csv(stream)
+        assert (
+            stream.getvalue()
+            == test_caaj_writer.TestSortedCaajWriter.get_expected_csv(caajs)
+        )
+
+    def test_to_dataframe(self):
+        caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs(50, 5)
+        caajs[3] = dataclasses.replace(caajs[3], caaj_to=None)
+        df = JournalBuffer(caajs).to_dataframe()
+        assert df["uti"].dtype == "category"
+        assert df["caaj_to"].isna().tolist() == [i == 3 for i in range(50)]
+        rows = df.astype(object).where(df.notna(), None).values.tolist()
+        assert rows == [list(dataclasses.astuple(caaj)) for caaj in caajs]
+
+    def test_memory(self):
+        get_caajs = test_caaj_writer.TestSortedCaajWriter.get_caajs
+        tracemalloc.start()
+        caajs = get_caajs(3000, 0)
+        list_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        journals = JournalBuffer(get_caajs(3000, 0))
+        buffer_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(journals) == len(caajs)
+        assert buffer_bytes * 3 < list_bytes
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import dataclasses
+import os
+import tempfile
+import unittest
+from test import test_pancake_plugin
+from unittest.mock import patch
+
+from pancake_plugin.caaj_writer import SortedCaajWriter
+from pancake_plugin.journal_merge import merge_caajs, read_caajs
+from pancake_plugin.pancake_plugin import PancakePlugin
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+OTHER = "0x0000000000000000000000000000000000000001"
+
+
+class TestJournalMerge(unittest.TestCase):
+    @classmethod
+    def get_caajs(cls, receipt_filenames: list) -> list:
+        test_case = test_pancake_plugin.TestPancakePlugin()
+        transactions = [
+            test_case.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in receipt_filenames
+        ]
+        with patch.object(PancakePlugin, "deterministic_uuid", True):
+            return PancakePlugin.get_caajs_many(
+                ADDRESS,
+                transactions,
+                test_pancake_plugin.TestPancakePlugin.get_token_table_mock(),
+            )
+
+    def test_merge_caajs(self):
+        first_run = self.get_caajs(["swap_bnb_to_cake", "swap_cake_to_bnb"])
+        restarted_run = self.get_caajs(["swap_cake_to_bnb", "swap_cake_to_eth"])
+        caajs = merge_caajs(first_run, restarted_run)
+        assert caajs == self.get_caajs(
+            ["swap_bnb_to_cake", "swap_cake_to_bnb", "swap_cake_to_eth"]
+        )
+
+        # a rerun replaces every journal of a transaction, not only matching ones
+        restarted_run[-1].amount = "0.1"
+        rerun = [caaj for caaj in restarted_run if caaj.type != "get"]
+        caajs = merge_caajs(first_run, rerun)
+        assert len(caajs) == 3 + 2 + 2
+        assert caajs[-1].amount == "0.1"
+
+        # nor does a leg the rerun journals with another token stay
+        rerun = [
+            dataclasses.replace(caaj, uti="eth/ethereum")
+            if caaj.type == "get"
+            else caaj
+            for caaj in first_run
+        ]
+        assert merge_caajs(first_run, rerun) == rerun
+
+        # journals of another wallet in the same trade are not replaced
+        other_wallet = [
+            dataclasses.replace(caaj, caaj_to=OTHER)
+            for caaj in first_run
+            if caaj.type == "get"
+        ]
+        caajs = merge_caajs(first_run, other_wallet)
+        assert caajs == first_run + other_wallet
+
+    def test_read_caajs(self):
+        caajs = self.get_caajs(["swap_cake_to_eth", "harvest_cake_bnb"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "result.csv")
+            with open(path, "w", encoding="utf-8", newline="") as output:
+                writer = SortedCaajWriter(output)
+                for caaj in caajs:
+                    writer.write(caaj)
+                writer.close()
+            assert list(read_caajs(path)) == caajs
+            assert merge_caajs(read_caajs(path), caajs) == caajs
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.client import IncompleteRead
+from test import benchmark_pancake_plugin
+from test.stub_bscscan_server import StubBscScanServer
+from unittest import mock
+
+from pancake_plugin.bscscan_client import BscScanClient
+from pancake_plugin.journal_service import JournalService, make_server
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.token_table import MemoizedTokenTable
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+
+
+class VersionedTokenTable:
+    def __init__(self, version: int):
+        self.version = version
+
+    def get_uti(self, chain: str, token_original_id: str) -> str:
+        return f"{token_original_id.lower()}/{chain}/v{self.version}"
+
+
+class FailingTokenTable:
+    # looks up the tokens of the first transaction, fails on a later one
+    def __init__(self):
+        self.lookups = 0
+
+    def get_uti(self, chain: str, token_original_id: str) -> str:
+        self.lookups += 1
+        if self.lookups > 2:
+            raise RuntimeError(f"no uti for {token_original_id}")
+        return f"{token_original_id.lower()}/{chain}"
+
+
+class TestJournalService(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubBscScanServer().start()
+        self.versions = iter(range(2, 100))
+        self.service = JournalService(
+            VersionedTokenTable(1),
+            lambda: VersionedTokenTable(next(self.versions)),
+            BscScanClient("key", self.stub.url),
+        )
+        self.server = make_server("127.0.0.1:0", self.service)
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        host, port = self.server.server_address
+        self.url = f"http://{host}:{port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.client.close()
+        self.stub.stop()
+
+    def request(self, path: str, body: bytes = None) -> list:
+        with urllib.request.urlopen(f"{self.url}{path}", data=body) as response:
+            assert response.headers["Content-Type"].startswith("text/csv")
+            return list(csv.DictReader(io.StringIO(response.read().decode())))
+
+    def get_json(self, path: str, body: bytes = None) -> dict:
+        with urllib.request.urlopen(f"{self.url}{path}", data=body) as response:
+            return json.load(response)
+
+    def test_journal_address(self):
+        rows = self.request(f"/journals/{ADDRESS}")
+        client = BscScanClient("key", self.stub.url)
+        expected = PancakePlugin.get_caajs_many(
+            ADDRESS,
+            client.get_transactions(ADDRESS),
+            VersionedTokenTable(1),
+        )
+        client.close()
+        assert len(rows) == len(expected) > 0
+        for row, caaj in zip(rows, expected):
+            assert row["transaction_id"] == caaj.transaction_id
+            assert (row["type"], row["amount"], row["uti"]) == (
+                caaj.type,
+                caaj.amount,
+                caaj.uti,
+            )
+
+        # receipts of the first request stay cached
+        receipt_requests = len(self.stub.requests)
+        assert len(self.request(f"/journals/{ADDRESS}")) == len(rows)
+        assert len(self.stub.requests) == receipt_requests + 1
+        status = self.get_json("/status")
+        assert status["requests"] == 2
+        assert status["token_lookups"]["hit"] > 0
+
+    def test_journal_receipts(self):
+        body = b"\n".join(
+            json.dumps(benchmark_pancake_plugin.load_record(receipt_filename)).encode()
+            for receipt_filename in ["swap_bnb_to_cake", "approve", "stake_cake_bnb"]
+        )
+        rows = self.request("/journals", body)
+        assert [row["service"] for row in rows] == [
+            "swap",
+            "swap",
+            "bsc",
+            "staking",
+            "bsc",
+        ]
+
+    def test_reload_token_table(self):
+        before = self.request(f"/journals/{ADDRESS}?startblock=14462000")
+        assert self.get_json("/token-table/reload", b"") == {"reloaded": True}
+        after = self.request(f"/journals/{ADDRESS}?startblock=14462000")
+        # fee rows are always bnb/bsc
+        assert {
+            row["uti"].rsplit("/", 1)[1] for row in before if row["service"] != "bsc"
+        } == {"v1"}
+        assert {
+            row["uti"].rsplit("/", 1)[1] for row in after if row["service"] != "bsc"
+        } == {"v2"}
+
+        thread = self.service.start_reloading(0.01)
+        thread.join(0.1)
+        self.service.stop()
+        thread.join()
+        assert self.service.token_table.token_table.version > 2
+
+    def test_errors(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.request("/unknown")
+        assert context.exception.code == 404
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.request("/journals", b"{}")
+        assert context.exception.code == 400
+
+    def test_cut_off_stream(self):
+        self.service.token_table = MemoizedTokenTable(FailingTokenTable())
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            with self.assertRaises(IncompleteRead):
+                self.request(f"/journals/{ADDRESS}")
+        assert f"journal stream of /journals/{ADDRESS} cut off" in stderr.getvalue()
+        assert "RuntimeError: no uti for" in stderr.getvalue()
+
+    def request_unix(self, request: bytes) -> bytes:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "journal.sock")
+            server = make_server(f"unix:{path}", self.service)
+            threading.Thread(
+                target=server.serve_forever, args=(0.05,), daemon=True
+            ).start()
+            with socket.socket(socket.AF_UNIX) as connection:
+                connection.connect(path)
+                connection.sendall(request)
+                response = b"".join(iter(lambda: connection.recv(4096), b""))
+            server.shutdown()
+            server.server_close()
+        return response
+
+    def test_unix_socket(self):
+        response = self.request_unix(
+            b"GET /status HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+        assert response.startswith(b"HTTP/1.1 200")
+        assert json.loads(response.split(b"\r\n\r\n", 1)[1])["requests"] == 0
+
+    def test_unix_socket_error(self):
+        # a malformed request is logged without a peer address
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            response = self.request_unix(b"GET / HTTP/1.1 garbage\r\n\r\n")
+        # the request line is unparsed, so only the error page is sent
+        assert b"Error code: 400" in response
+        assert stderr.getvalue().startswith("unix - - ")
+        assert "Bad request" in stderr.getvalue()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from test import test_pancake_plugin
+
+from pancake_plugin.multi_address import (
+    TaggedCaajWriter,
+    interleave_addresses,
+    map_addresses,
+    read_addresses,
+)
+from pancake_plugin.pancake_plugin import PancakePlugin
+
+
+class TestMultiAddress(unittest.TestCase):
+    def test_read_addresses(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "addresses.txt")
+            with open(path, "w", encoding="utf-8") as file_addresses:
+                file_addresses.write(
+                    "# treasury\n"
+                    "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E\n"
+                    "\n"
+                    "0x3c783c21a0383057D128bae431894a5C19F9Cf06  # sub account\n"
+                    "0xda28ecfc40181a6dad8b52723035dfba3386d26e\n"
+                )
+            assert read_addresses(path) == [
+                "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+                "0x3c783c21a0383057D128bae431894a5C19F9Cf06",
+            ]
+
+    def test_map_addresses(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def journal(address):
+            with lock:
+                running.append(address)
+                peak.append(len(running))
+            time.sleep(0.05 if address == "a" else 0.01)
+            with lock:
+                running.remove(address)
+            return address.upper()
+
+        results = list(map_addresses(journal, ["a", "b", "c", "d", "e"], 3))
+        assert results == [("a", "A"), ("b", "B"), ("c", "C"), ("d", "D"), ("e", "E")]
+        assert max(peak) == 3
+
+    def test_interleave_addresses(self):
+        produced = []
+
+        def iterate(address):
+            for position in range(100):
+                produced.append(address)
+                yield f"{address}{position}"
+
+        items = interleave_addresses(iterate, ["a", "b", "c"], 2, queue_size=5)
+        first = [next(items) for _ in range(5)]
+        time.sleep(0.05)
+        # the producers wait for the consumer instead of reading ahead
+        assert len(produced) <= 5 + 5 + 2
+        rest = list(items)
+        assert sorted(first + rest) == sorted(
+            f"{address}{position}" for address in "abc" for position in range(100)
+        )
+        # an address keeps its order
+        assert [item for item in first + rest if item[0] == "b"] == [
+            f"b{position}" for position in range(100)
+        ]
+
+    def test_interleave_addresses_error(self):
+        def iterate(address):
+            yield address
+            if address == "b":
+                raise ValueError(address)
+
+        with self.assertRaises(ValueError):
+            list(interleave_addresses(iterate, ["a", "b", "c"], 2))
+
+    def test_tagged_caaj_writer(self):
+        transaction = test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+            "header", "swap_cake_to_eth"
+        )
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+            transaction,
+            test_pancake_plugin.TestPancakePlugin.get_token_table_mock(),
+        )
+        stream = io.StringIO()
+        writer = TaggedCaajWriter(stream)
+        writer.write("0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", caajs)
+        lines = stream.getvalue().splitlines()
+        assert lines[0].startswith("address,executed_at,platform,")
+        assert len(lines) == 4
+        assert lines[1].startswith(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E,2021-12-28 01:28:52,bsc,"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
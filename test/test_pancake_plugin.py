@@ -1,12 +1,21 @@
 import json
 import unittest
+from test import benchmark_pancake_plugin
 from typing import Optional
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from hexbytes import HexBytes
 from senkalib.platform.bsc.bsc_transaction import BscTransaction
 
-from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.pancake_plugin import (
+    ERC20_TRANSFER_TOPIC,
+    ERC20_TRANSFER_TOPIC_BYTES,
+    WETH_DEPOSIT_TOPIC_BYTES,
+    PancakePlugin,
+    ReceiptIndex,
+    to_address_bytes,
+)
+from pancake_plugin.receipt_cache import to_bsc_transaction
 
 
 class TestPancakePlugin(unittest.TestCase):
@@ -47,6 +56,31 @@ class TestPancakePlugin(unittest.TestCase):
                 and token_original_id == "0x2170Ed0880ac9A755fd29B2688956BD959F933F8"
             ):
                 return "eth/ethereum"
+            elif (
+                chain == "bsc"
+                and token_original_id == "0xe9e7CEA3DedcA5984780Bafc599bD69ADd087D56"
+            ):
+                return "busd/bsc"
+            elif (
+                chain == "bsc"
+                and token_original_id == "0x55d398326f99059fF775485246999027B3197955"
+            ):
+                return "usdt/bsc"
+            elif (
+                chain == "bsc"
+                and token_original_id == "0x0eD7e52944161450477ee417DE9Cd3a859b14fD0"
+            ):
+                return "cake-bnb-lp/bsc"
+            elif (
+                chain == "bsc"
+                and token_original_id == "0x7213a321F1855CF1779f42c0CD85d3D95291D34C"
+            ):
+                return "busd-eth-lp/bsc"
+            elif (
+                chain == "bsc"
+                and token_original_id == "0x531FEbfeb9a61D948c384ACFBe6dCc51057AEa7e"
+            ):
+                return "eth-usdt-lp/bsc"
             else:
                 raise ValueError(
                     f"unknown token_original_id is given: {token_original_id}"
@@ -66,6 +100,31 @@ class TestPancakePlugin(unittest.TestCase):
         swap_type = PancakePlugin.can_handle(transaction)
         assert swap_type is False
 
+        transaction = self.get_bsc_transaction("header", "swap_bnb_to_cake")
+        transaction.transaction_receipt["to"] = transaction.transaction_receipt[
+            "to"
+        ].lower()
+        assert PancakePlugin.can_handle(transaction)
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+            transaction,
+            TestPancakePlugin.get_token_table_mock(),
+        )
+        assert [caaj.type for caaj in caajs] == ["lose", "get", "lose"]
+
+    def test_can_handle_many(self):
+        mask = PancakePlugin.can_handle_many(
+            [
+                "0x10ED43C718714eb63d5aA57B78B54704E256024E",
+                "0x10ed43c718714eb63d5aa57b78b54704e256024e",
+                "0x73FEAA1EE314F8C655E354234017BE2193C9E24E",
+                "0xA39Af17CE4a8eb807E076805Da1e2B8EA7D0755b",
+                None,
+                "",
+            ]
+        )
+        assert mask == [True, True, True, False, False, False]
+
     def test_transaction_fee(self):
         transaction = self.get_bsc_transaction("header", "swap_bnb_to_cake")
         mock = TestPancakePlugin.get_token_table_mock()
@@ -249,6 +308,53 @@ class TestPancakePlugin(unittest.TestCase):
         )
         assert caaj_transaction_swap.comment == "pancakeswap swap"
 
+    def test_get_caajs_swap_multi_hop(self):
+        # cake -> wbnb -> eth through two pairs, part of the cake refunded
+        record = benchmark_pancake_plugin.load_record("swap_cake_to_eth")
+        logs = record["receipt"]["logs"]
+        user = logs[0]["topics"][1]
+        first_pair = logs[0]["topics"][2]
+        second_pair = (
+            "0x0000000000000000000000000ed7e52944161450477ee417de9cd3a859b14fd0"
+        )
+        logs[2]["topics"][1] = second_pair
+        logs.insert(
+            2,
+            {
+                "address": "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c",
+                "topics": [ERC20_TRANSFER_TOPIC, first_pair, second_pair],
+                "data": f"0x{3 * 10**16:064x}",
+                "logIndex": None,
+            },
+        )
+        logs.append(
+            {
+                "address": "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82",
+                "topics": [ERC20_TRANSFER_TOPIC, first_pair, user],
+                "data": f"0x{25 * 10**16:064x}",
+                "logIndex": None,
+            }
+        )
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+            to_bsc_transaction(record),
+            mock,
+        )
+        assert [(caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("lose", "0.75", "cake/bsc"),
+            ("get", "0.003189165151348716", "eth/ethereum"),
+            ("lose", "0.00067182", "bnb/bsc"),
+        ]
+
+        padded = benchmark_pancake_plugin.pad_record(record, 500)
+        padded_caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+            to_bsc_transaction(padded),
+            mock,
+        )
+        assert [caaj.amount for caaj in padded_caajs] == [caaj.amount for caaj in caajs]
+
     def test_get_caajs_failed(self):
         transaction = self.get_bsc_transaction("header", "transaction_fail")
         mock = TestPancakePlugin.get_token_table_mock()
@@ -257,14 +363,329 @@ class TestPancakePlugin(unittest.TestCase):
         )
         assert not caajs
 
-    # TODO: 未対応トランザクションファイル
-    # - liquidity_add_bnb_cake
-    # - liquidity_add_busd_eth
-    # - liquidity_remove_bnb_cake
-    # - liquidity_remove_eth_busd
-    # - unstake_cake_bnb
-    # - stake_cake_bnb
-    # - harvest_cake_bnb
+    def test_get_caajs_by_address(self):
+        # the cake bought by the treasury goes to one of its sub-accounts
+        record = benchmark_pancake_plugin.load_record("swap_bnb_to_cake")
+        treasury = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        sub_account = "0x00000000000000000000000000000000000000aB"
+        record["receipt"]["logs"][2]["topics"][2] = "0x" + "0" * 62 + "ab"
+        transaction = to_bsc_transaction(record)
+        mock = TestPancakePlugin.get_token_table_mock()
+
+        with patch.object(PancakePlugin, "deterministic_uuid", True):
+            caajs = PancakePlugin.get_caajs_by_address(
+                [treasury, sub_account, "0x" + "1" * 40], transaction, mock
+            )
+            assert caajs[treasury] == PancakePlugin.get_caajs(
+                treasury, transaction, mock
+            )
+        assert [(caaj.type, caaj.uti) for caaj in caajs[treasury]] == [
+            ("lose", "bnb/bsc"),
+            ("lose", "bnb/bsc"),
+        ]
+        assert caajs["0x" + "1" * 40] == []
+        assert len(caajs[sub_account]) == 1
+        caaj = caajs[sub_account][0]
+        assert (caaj.service, caaj.type, caaj.uti) == ("swap", "get", "cake/bsc")
+        assert caaj.amount == "21.562948714728883817"
+        assert caaj.caaj_from == "0x0eD7e52944161450477ee417DE9Cd3a859b14fD0"
+        assert caaj.caaj_to == sub_account
+        assert caaj.trade_uuid == caajs[treasury][0].trade_uuid
+
+        caajs = PancakePlugin.get_caajs_by_address([sub_account], transaction, mock)
+        assert len(caajs[sub_account]) == 1
+
+    def test_journal_many_by_address(self):
+        transactions = [
+            self.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in ["swap_bnb_to_cake", "approve", "swap_cake_to_eth"]
+        ]
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        pair = "0x0eD7e52944161450477ee417DE9Cd3a859b14fD0"
+        mock = TestPancakePlugin.get_token_table_mock()
+        # a transaction listed for both wallets is journaled once
+        journals = PancakePlugin.journal_many_by_address(
+            [address, pair], transactions + transactions[:1], mock
+        )
+        assert len(journals[address]) == 6
+        assert journals[pair].get_column("type") == ["get", "lose"]
+
+    def test_deterministic_uuid(self):
+        transaction = self.get_bsc_transaction("header", "swap_cake_to_eth")
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(address, transaction, mock)
+        assert (
+            caajs[0].trade_uuid
+            != PancakePlugin.get_caajs(address, transaction, mock)[0].trade_uuid
+        )
+
+        with patch.object(PancakePlugin, "deterministic_uuid", True):
+            caajs = PancakePlugin.get_caajs(address, transaction, mock)
+            rerun = PancakePlugin.get_caajs(address, transaction, mock)
+        assert caajs == rerun
+        assert caajs[0].trade_uuid == "e9d91935-a582-5873-9b52-751d3c84976b"
+
+    def test_receipt_index(self):
+        transaction = self.get_bsc_transaction("header", "swap_bnb_to_cake")
+        index = ReceiptIndex(transaction)
+        assert index.executed_at == "2021-12-28 01:28:52"
+        assert (
+            index.transaction_id
+            == "0x4f8534e85849cb54f0ae4ca0718939ab22de248f64e2e4dc607a76b12f20f109"
+        )
+        assert index.sender == bytes.fromhex("da28ecfc40181a6dad8b52723035dfba3386d26e")
+        assert index.recipient == bytes.fromhex(
+            "10ed43c718714eb63d5aa57b78b54704e256024e"
+        )
+        assert index.has_topic(WETH_DEPOSIT_TOPIC_BYTES)
+        assert index.has_topic(ERC20_TRANSFER_TOPIC_BYTES)
+        assert not index.has_topic(ERC20_TRANSFER_TOPIC)
+        assert index.get_log_by_topic(WETH_DEPOSIT_TOPIC_BYTES) is index.logs[0]
+        assert len(index.transfer_logs) == 2
+        assert index.get_transfers_from(index.sender) == []
+        debit_logs = index.get_transfers_to(
+            to_address_bytes("0xDa28ecfc40181a6DAD8b52723035DFba3386d26E")
+        )
+        assert len(debit_logs) == 1
+        assert debit_logs[0]["address"] == "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82"
+
+    def test_get_caajs_many(self):
+        transactions = [
+            self.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in [
+                "swap_bnb_to_cake",
+                "approve",
+                "swap_cake_to_bnb",
+                "swap_cake_to_eth",
+                "swap_bnb_to_cake",
+            ]
+        ]
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+
+        mock = TestPancakePlugin.get_token_table_mock()
+        expected = []
+        for transaction in transactions:
+            if PancakePlugin.can_handle(transaction):
+                expected.extend(PancakePlugin.get_caajs(address, transaction, mock))
+        assert mock.get_uti.call_count == 8
+
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs_many(address, transactions, mock)
+        assert mock.get_uti.call_count == 3
+
+        assert len(caajs) == len(expected) == 12
+        for caaj, expected_caaj in zip(caajs, expected):
+            expected_caaj.trade_uuid = caaj.trade_uuid
+            assert caaj == expected_caaj
+
+    def test_journal_many(self):
+        transactions = [
+            self.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in ["swap_bnb_to_cake", "approve", "swap_cake_to_eth"]
+        ]
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        mock = TestPancakePlugin.get_token_table_mock()
+        journals = PancakePlugin.journal_many(address, transactions, mock)
+        assert len(journals) == 6
+        assert journals.get_column("uti") == [
+            "bnb/bsc",
+            "cake/bsc",
+            "bnb/bsc",
+            "cake/bsc",
+            "eth/ethereum",
+            "bnb/bsc",
+        ]
+        assert journals.columns["uti"].values == ["bnb/bsc", "cake/bsc", "eth/ethereum"]
+
+        caajs = PancakePlugin.get_caajs_many(address, transactions, mock)
+        for caaj, journal in zip(caajs, journals.iter_caajs()):
+            journal.trade_uuid = caaj.trade_uuid
+            assert caaj == journal
+
+    def test_get_caajs_liquidity_add_bnb_cake(self):
+        transaction = self.get_bsc_transaction("header", "liquidity_add_bnb_cake")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert len({caaj.trade_uuid for caaj in caajs}) == 1
+
+        caaj_liquidity = caajs[0]
+        assert caaj_liquidity.platform == "bsc"
+        assert caaj_liquidity.application == "pancakeswap"
+        assert caaj_liquidity.service == "liquidity"
+        assert caaj_liquidity.type == "lose"
+        assert caaj_liquidity.amount == "0.497952988038470308"
+        assert caaj_liquidity.uti == "bnb/bsc"
+        assert caaj_liquidity.caaj_from == "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        assert caaj_liquidity.caaj_to == "0x10ED43C718714eb63d5aA57B78B54704E256024E"
+        assert caaj_liquidity.comment == "pancakeswap add liquidity"
+
+        assert [
+            (caaj.service, caaj.type, caaj.amount, caaj.uti) for caaj in caajs[1:]
+        ] == [
+            ("liquidity", "lose", "21.562948714728883817", "cake/bsc"),
+            ("liquidity", "get", "3.164332228458444898", "cake-bnb-lp/bsc"),
+            ("bsc", "lose", "0.00067182", "bnb/bsc"),
+        ]
+        assert caajs[2].caaj_from == "0x10ED43C718714eb63d5aA57B78B54704E256024E"
+        assert caajs[2].caaj_to == "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+
+    def test_get_caajs_liquidity_add_busd_eth(self):
+        transaction = self.get_bsc_transaction("header", "liquidity_add_busd_eth")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [(caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("lose", "4.777146419651962634", "busd/bsc"),
+            ("lose", "0.001481713954703829", "eth/ethereum"),
+            ("get", "0.036045299930279785", "busd-eth-lp/bsc"),
+            ("lose", "0.00067182", "bnb/bsc"),
+        ]
+
+    def test_get_caajs_liquidity_add_to_other_address(self):
+        # lp tokens minted to the router's `to` address, not to the sender
+        transaction = self.get_bsc_transaction("header", "liquidity_add_busd_eth")
+        mint_log = transaction.transaction_receipt["logs"][5]
+        mint_log["topics"][2] = HexBytes(
+            "0x000000000000000000000000b1b9b4bbe8a92d535f5df2368e7fd2ecfb3a1950"
+        )
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [(caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("lose", "4.777146419651962634", "busd/bsc"),
+            ("lose", "0.001481713954703829", "eth/ethereum"),
+            ("lose", "0.00067182", "bnb/bsc"),
+        ]
+
+    def test_get_caajs_liquidity_remove_bnb_cake(self):
+        transaction = self.get_bsc_transaction("header", "liquidity_remove_bnb_cake")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [(caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("lose", "3.164332228458444898", "cake-bnb-lp/bsc"),
+            ("get", "21.5721707333114908", "cake/bsc"),
+            ("get", "0.497740943162833803", "bnb/bsc"),
+            ("lose", "0.00067182", "bnb/bsc"),
+        ]
+        assert {caaj.comment for caaj in caajs[:3]} == {"pancakeswap remove liquidity"}
+
+    def test_get_caajs_liquidity_remove_eth_busd(self):
+        transaction = self.get_bsc_transaction("header", "liquidity_remove_eth_busd")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [(caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("lose", "0.143435764222230339", "eth-usdt-lp/bsc"),
+            ("get", "0.003470017891951227", "eth/ethereum"),
+            ("get", "10.957944733812157838", "usdt/bsc"),
+            ("lose", "0.00067182", "bnb/bsc"),
+        ]
+
+    def test_get_caajs_stake_cake_bnb(self):
+        transaction = self.get_bsc_transaction("header", "stake_cake_bnb")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert len(caajs) == 2
+        assert caajs[0].trade_uuid == caajs[1].trade_uuid
+
+        caaj_stake = caajs[0]
+        assert caaj_stake.platform == "bsc"
+        assert caaj_stake.application == "pancakeswap"
+        assert caaj_stake.service == "staking"
+        assert (
+            caaj_stake.transaction_id
+            == "0x0ccda1b34404e55bd211144b7d024f03c47bdc1fd8a47396271ffe1f63a8c0cb"
+        )
+        assert caaj_stake.type == "deposit"
+        assert caaj_stake.amount == "0.291597195540468368"
+        assert caaj_stake.uti == "cake-bnb-lp/bsc"
+        assert caaj_stake.caaj_from == "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        assert caaj_stake.caaj_to == "0x73feaa1eE314F8c655E354234017bE2193C9E24E"
+        assert caaj_stake.comment == "pancakeswap stake"
+        assert caajs[1].comment == "pancakeswap transaction fee"
+
+    def test_get_caajs_unstake_cake_bnb(self):
+        transaction = self.get_bsc_transaction("header", "unstake_cake_bnb")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [
+            (caaj.type, caaj.amount, caaj.uti, caaj.caaj_from, caaj.comment)
+            for caaj in caajs[:2]
+        ] == [
+            (
+                "get",
+                "0.000001921276476768",
+                "cake/bsc",
+                "0x009cF7bC57584b7998236eff51b98A168DceA9B0",
+                "pancakeswap reward",
+            ),
+            (
+                "withdraw",
+                "0.291597195540468368",
+                "cake-bnb-lp/bsc",
+                "0x73feaa1eE314F8c655E354234017bE2193C9E24E",
+                "pancakeswap unstake",
+            ),
+        ]
+        assert {caaj.caaj_to for caaj in caajs[:2]} == {
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        }
+        assert caajs[2].comment == "pancakeswap transaction fee"
+
+    def test_get_caajs_harvest_cake_bnb(self):
+        transaction = self.get_bsc_transaction("header", "harvest_cake_bnb")
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs(
+            "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", transaction, mock
+        )
+        assert [(caaj.service, caaj.type, caaj.amount, caaj.uti) for caaj in caajs] == [
+            ("staking", "get", "0.013002837223798937", "cake/bsc"),
+            ("bsc", "lose", "0.00067182", "bnb/bsc"),
+        ]
+        assert PancakePlugin.get_pool_id(ReceiptIndex(transaction)) == 251
+
+    def test_get_caajs_many_aggregate_rewards(self):
+        transactions = [
+            self.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in [
+                "harvest_cake_bnb",
+                "harvest_busd_bnb",
+                "swap_bnb_to_cake",
+                "harvest_cake_bnb",
+                "unstake_cake_bnb",
+            ]
+        ]
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        mock = TestPancakePlugin.get_token_table_mock()
+        caajs = PancakePlugin.get_caajs_many(
+            address, transactions, mock, aggregate_rewards=True
+        )
+        rewards = [
+            caaj for caaj in caajs if caaj.type == "get" and caaj.service == "staking"
+        ]
+        assert [(caaj.amount, caaj.comment) for caaj in rewards] == [
+            ("0.026007595724074642", "pancakeswap reward, pool 251, 3 harvests"),
+            ("0.026089872305091838", "pancakeswap reward, pool 252, 1 harvest"),
+        ]
+        # five fees, the swap, the unstake and the two rolled up rewards
+        assert len(caajs) == 5 + 2 + 1 + 2
+
+        caajs = PancakePlugin.get_caajs_many(address, transactions, mock)
+        assert (
+            len([caaj for caaj in caajs if caaj.comment == "pancakeswap reward"]) == 4
+        )
 
     def get_bsc_transaction(self, header_filename, receipt_filename):
         file_header = open(
@@ -0,0 +1,145 @@
+import threading
+import time
+import unittest
+from test.stub_bscscan_server import StubBscScanServer
+
+from pancake_plugin.bscscan_client import BscScanClient, BscScanError
+from pancake_plugin.rate_limiter import (
+    THROTTLE_WINDOW,
+    AdaptiveRateLimiter,
+    get_backoff,
+)
+
+ADDRESS = "0xDa28ecfc40181a6DAD8B52723035DFBA3386d26E"
+TX_HASH = "0x4f8534e85849cb54f0ae4ca0718939ab22de248f64e2e4dc607a76b12f20f109"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_acquire(self):
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=5, clock=clock, sleep=clock.sleep)
+        for _ in range(15):
+            limiter.acquire()
+        # a burst of 5, then 5 calls per second
+        self.assertAlmostEqual(clock.now, 2.0)
+
+    def test_throttle(self):
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=4, clock=clock, sleep=clock.sleep)
+        assert limiter.throttle()
+        # the rest of a burst of rate limited calls does not lower it again
+        assert not limiter.throttle()
+        assert limiter.rate == 2
+        clock.now += THROTTLE_WINDOW
+        limiter.tokens = 0.0
+        assert limiter.throttle()
+        assert limiter.rate == 1
+        start = clock.now
+        for _ in range(3):
+            limiter.acquire()
+        self.assertAlmostEqual(clock.now - start, 3.0)
+        for _ in range(100):
+            limiter.recover()
+        assert limiter.rate == 4
+        for _ in range(10):
+            clock.now += THROTTLE_WINDOW
+            limiter.throttle()
+        assert limiter.rate == 0.5
+
+    def test_throttle_epoch(self):
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=8, clock=clock, sleep=lambda _: None)
+        epochs = [limiter.acquire() for _ in range(12)]
+        # 4 calls reserved beyond the burst, half a second of waits
+        self.assertAlmostEqual(limiter.tokens, -4.0)
+        assert limiter.throttle(epochs[0])
+        assert limiter.rate == 4
+        # the reservations still take the half second they were given
+        self.assertAlmostEqual(limiter.tokens, -2.0)
+        clock.now += THROTTLE_WINDOW
+        # calls granted before the throttle come back limited as well
+        assert not any(limiter.throttle(epoch) for epoch in epochs[1:])
+        assert limiter.throttle(limiter.acquire())
+        assert limiter.rate == 2
+
+    def test_get_backoff(self):
+        for attempt in range(10):
+            backoff = get_backoff(attempt, base=1, cap=8)
+            assert 0 <= backoff <= min(8, 2**attempt)
+
+    def test_rate_limited(self):
+        for rate_limit_status in [200, 429]:
+            with StubBscScanServer(
+                rate_limit=8, rate_limit_status=rate_limit_status
+            ) as stub:
+                client = BscScanClient(
+                    "key",
+                    stub.url,
+                    limiter=AdaptiveRateLimiter(rate=50),
+                    max_retries=20,
+                    backoff=lambda attempt: 0.05,
+                )
+                start = time.monotonic()
+                transactions = list(client.get_transactions(ADDRESS, workers=4))
+                elapsed = time.monotonic() - start
+                client.close()
+
+            assert len(transactions) == 13
+            stats = client.get_stats()
+            assert stats["rate_limited"] == stub.rate_limited > 0
+            assert stats["retries"] == stats["rate_limited"]
+            assert stats["calls"] == len(stub.requests)
+            assert stats["rate"] < 50
+            # a burst of rate limited calls lowers the rate once, not to its
+            # floor. the 14 calls at 8 per second take about 2 seconds
+            assert stats["rate"] >= 50 / 8
+            assert elapsed < 4
+
+    def test_coalesce(self):
+        with StubBscScanServer(latency=0.2) as stub:
+            client = BscScanClient("key", stub.url)
+            receipts = []
+            threads = [
+                threading.Thread(
+                    target=lambda: receipts.append(
+                        client.get_transaction_receipt(TX_HASH)
+                    )
+                )
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(stub.requests) == 1
+        assert len(receipts) == 5
+        assert all(receipt == receipts[0] for receipt in receipts)
+        assert client.get_stats()["coalesced"] == 4
+
+    def test_budget(self):
+        with StubBscScanServer() as stub:
+            client = BscScanClient("key", stub.url, budget=2)
+            client.get_transaction_receipt(TX_HASH)
+            client.get_txs(ADDRESS)
+            with self.assertRaises(BscScanError):
+                client.get_transaction_receipt(TX_HASH)
+            client.close()
+
+        assert len(stub.requests) == 2
+        assert client.get_stats()["budget_left"] == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
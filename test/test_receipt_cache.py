@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+from test import test_pancake_plugin
+from unittest.mock import patch
+
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.receipt_cache import ReceiptCache, to_bsc_transaction, to_record
+
+
+class TestReceiptCache(unittest.TestCase):
+    def get_record(self, receipt_filename):
+        with open("test/testdata/header.json", "r", encoding="utf-8") as file_header:
+            header = json.load(file_header)
+        with open(
+            f"test/testdata/transaction_receipt/{receipt_filename}.json",
+            "r",
+            encoding="utf-8",
+        ) as file_receipt:
+            receipt = json.load(file_receipt)
+        header["hash"] = receipt["transactionHash"]
+        return to_record(header, receipt)
+
+    def test_put_and_get(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.sqlite")
+            record = self.get_record("swap_cake_to_eth")
+            with ReceiptCache(path) as cache:
+                assert record["hash"] not in cache
+                assert cache.get(record["hash"]) is None
+                cache.put(record)
+                assert record["hash"] in cache
+                assert record["hash"].upper() in cache
+
+            with ReceiptCache(path) as cache:
+                assert len(cache) == 1
+                assert cache.get(record["hash"]) == record
+
+    def test_max_receipts(self):
+        records = [
+            self.get_record(receipt_filename)
+            for receipt_filename in ["swap_bnb_to_cake", "swap_cake_to_bnb", "approve"]
+        ]
+        with ReceiptCache(":memory:", max_receipts=2) as cache:
+            cache.put(records[0])
+            cache.put(records[1])
+            cache.put(records[1])
+            assert len(cache) == 2
+            cache.put(records[2])
+            # the receipt stored first is dropped
+            assert len(cache) == 2
+            assert records[0]["hash"] not in cache
+            assert cache.get(records[2]["hash"]) == records[2]
+
+    def test_to_bsc_transaction(self):
+        mock = test_pancake_plugin.TestPancakePlugin.get_token_table_mock()
+        address = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+        for receipt_filename in [
+            "swap_bnb_to_cake",
+            "swap_cake_to_bnb",
+            "swap_cake_to_eth",
+            "transaction_fail",
+        ]:
+            transaction = test_pancake_plugin.TestPancakePlugin().get_bsc_transaction(
+                "header", receipt_filename
+            )
+            record = json.loads(json.dumps(self.get_record(receipt_filename)))
+            cached_transaction = to_bsc_transaction(record)
+            assert (
+                cached_transaction.get_transaction_id()
+                == transaction.get_transaction_id()
+            )
+            assert cached_transaction.get_timestamp() == transaction.get_timestamp()
+            assert (
+                cached_transaction.get_transaction_fee()
+                == transaction.get_transaction_fee()
+            )
+
+            with patch.object(PancakePlugin, "_get_uuid", return_value="uuid"):
+                expected = PancakePlugin.get_caajs(address, transaction, mock)
+                caajs = PancakePlugin.get_caajs(address, cached_transaction, mock)
+            assert caajs == expected
+
+
+if __name__ == "__main__":
+    unittest.main()
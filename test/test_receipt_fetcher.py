@@ -0,0 +1,80 @@
+import random
+import time
+import unittest
+from test.stub_bscscan_server import StubBscScanServer
+
+from pancake_plugin.bscscan_client import BscScanClient
+from pancake_plugin.receipt_cache import ReceiptCache
+from pancake_plugin.receipt_fetcher import ReceiptFetcher
+
+ADDRESS = "0xDa28ecfc40181a6DAD8B52723035DFBA3386d26E"
+
+
+class TestReceiptFetcher(unittest.TestCase):
+    def test_fetch(self):
+        def fetch_receipt(tx_hash):
+            time.sleep(random.random() / 100)
+            return {"transactionHash": tx_hash}
+
+        tx_hashes = [f"0x{i}" for i in range(50)]
+        for workers in [1, 8]:
+            with ReceiptFetcher(fetch_receipt, workers) as fetcher:
+                receipts = list(fetcher.fetch(tx_hashes))
+            assert [receipt["transactionHash"] for receipt in receipts] == tx_hashes
+
+    def test_get_transactions(self):
+        def journal(workers):
+            client = BscScanClient("key", stub.url)
+            started = time.perf_counter()
+            transactions = list(
+                client.get_transactions(ADDRESS, page_size=5, workers=workers)
+            )
+            elapsed = time.perf_counter() - started
+            client.close()
+            return [
+                (
+                    transaction.transaction_id,
+                    transaction.transaction_receipt,
+                    transaction.get_timestamp(),
+                    transaction.get_transaction_fee(),
+                )
+                for transaction in transactions
+            ], elapsed
+
+        with StubBscScanServer(latency=0.05) as stub:
+            serial, serial_elapsed = journal(1)
+            assert stub.max_in_flight == 1
+            requests = [
+                params["txhash"]
+                for params in stub.requests
+                if params["action"] == "eth_getTransactionReceipt"
+            ]
+            connections = stub.connections
+            concurrent, concurrent_elapsed = journal(8)
+
+        assert len(serial) == 13
+        assert concurrent == serial
+        assert stub.max_in_flight > 1
+        assert concurrent_elapsed < serial_elapsed / 2
+        # requests reuse their worker's keep-alive connection
+        assert requests == [transaction[0] for transaction in serial]
+        assert connections == 1
+        assert stub.connections - connections <= 8
+
+    def test_get_transactions_cache(self):
+        with StubBscScanServer() as stub:
+            client = BscScanClient("key", stub.url)
+            cache = ReceiptCache(":memory:")
+            first = list(client.get_transactions(ADDRESS, cache, workers=4))
+            requests = len(stub.requests)
+            second = list(client.get_transactions(ADDRESS, cache, workers=4))
+            client.close()
+
+        assert len(stub.requests) == requests + 1
+        assert [transaction.transaction_id for transaction in second] == [
+            transaction.transaction_id for transaction in first
+        ]
+
+
+if __name__ == "__main__":
+    unittest.main()
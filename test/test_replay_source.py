@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+from test import benchmark_pancake_plugin, test_pancake_plugin
+from unittest.mock import patch
+
+from pancake_plugin.pancake_plugin import PancakePlugin
+from pancake_plugin.replay_source import iter_records, iter_replay, write_dump
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ADDRESS = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E"
+RECEIPT_FILENAMES = ["swap_bnb_to_cake", "approve", "liquidity_add_bnb_cake"]
+
+
+class TestReplaySource(unittest.TestCase):
+    @classmethod
+    def get_records(cls) -> list:
+        records = [
+            benchmark_pancake_plugin.load_record(receipt_filename)
+            for receipt_filename in RECEIPT_FILENAMES
+        ]
+        for block, record in enumerate(records):
+            record["receipt"]["blockNumber"] = 100 + block
+        return records
+
+    def assert_replayed(self, path: str):
+        test_case = test_pancake_plugin.TestPancakePlugin()
+        transactions = [
+            test_case.get_bsc_transaction("header", receipt_filename)
+            for receipt_filename in RECEIPT_FILENAMES
+        ]
+        mock = test_pancake_plugin.TestPancakePlugin.get_token_table_mock()
+        with patch.object(PancakePlugin, "deterministic_uuid", True):
+            expected = PancakePlugin.get_caajs_many(ADDRESS, transactions, mock)
+            caajs = PancakePlugin.get_caajs_many(ADDRESS, iter_replay(path), mock)
+        assert len(caajs) == 3 + 4
+        assert caajs == expected
+
+    def test_plain(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.ndjson")
+            assert write_dump(path, self.get_records()) == 3
+            self.assert_replayed(path)
+
+            transactions = list(iter_replay(path, startblock=101))
+            assert len(transactions) == 2
+            assert (
+                list(iter_replay(path, "0x3c783c21a0383057D128bae431894a5C19F9Cf06"))
+                == []
+            )
+            assert len(list(iter_replay(path, ADDRESS.lower()))) == 3
+
+            open(path, "w").close()
+            assert list(iter_records(path)) == []
+
+    def test_gzip_with_headers(self):
+        with open("test/testdata/header.json", "r", encoding="utf-8") as file_header:
+            header = json.load(file_header)
+        lines = []
+        for receipt_filename in RECEIPT_FILENAMES:
+            with open(
+                f"test/testdata/transaction_receipt/{receipt_filename}.json",
+                "r",
+                encoding="utf-8",
+            ) as file_receipt:
+                receipt = json.load(file_receipt)
+            lines.append(
+                {
+                    "header": {**header, "hash": receipt["transactionHash"]},
+                    "receipt": receipt,
+                }
+            )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "receipts.ndjson.gz")
+            write_dump(path, lines)
+            with open(path, "rb") as file_dump:
+                assert file_dump.read(2) == b"\x1f\x8b"
+            self.assert_replayed(path)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            plain_path = os.path.join(tmpdir, "receipts.ndjson")
+            write_dump(plain_path, self.get_records())
+            path = os.path.join(tmpdir, "receipts.ndjson.zst")
+            with open(plain_path, "rb") as plain, open(path, "wb") as compressed:
+                compressed.write(zstandard.ZstdCompressor().compress(plain.read()))
+            self.assert_replayed(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from senkalib.caaj_journal import CaajJournal
+
+from pancake_plugin.reward_rollup import RewardRollup
+
+
+class TestRewardRollup(unittest.TestCase):
+    @classmethod
+    def get_caaj(
+        cls,
+        executed_at: str,
+        transaction_id: str,
+        wallet: str = "0xDa28ecfc40181a6DAD8b52723035DFba3386d26E",
+    ) -> CaajJournal:
+        return CaajJournal(
+            executed_at,
+            "bsc",
+            "pancakeswap",
+            "staking",
+            transaction_id,
+            "uuid",
+            "get",
+            "0",
+            "cake/bsc",
+            "0x009cF7bC57584b7998236eff51b98A168DceA9B0",
+            wallet,
+            "pancakeswap reward",
+        )
+
+    def test_flush(self):
+        rewards = RewardRollup()
+        rewards.add(251, self.get_caaj("2021-12-28 01:00:00", "0x1"), 5 * 10**17, 18)
+        rewards.add(251, self.get_caaj("2021-12-28 09:00:00", "0x2"), 5 * 10**17, 18)
+        rewards.add(252, self.get_caaj("2021-12-28 10:00:00", "0x3"), 10**16, 18)
+        rewards.add(251, self.get_caaj("2021-12-29 01:00:00", "0x4"), 10**18, 18)
+
+        assert rewards.flush("2021-12-28") == []
+        caajs = rewards.flush("2021-12-29")
+        first_uuid = caajs[0].trade_uuid
+        assert [(caaj.amount, caaj.transaction_id) for caaj in caajs] == [
+            ("1", "0x2"),
+            ("0.01", "0x3"),
+        ]
+        assert caajs[0].executed_at == "2021-12-28 09:00:00"
+        assert caajs[0].comment == "pancakeswap reward, pool 251, 2 harvests"
+        assert caajs[1].comment == "pancakeswap reward, pool 252, 1 harvest"
+        # a rollup has a trade_uuid of its own, the same on every run
+        assert caajs[0].trade_uuid != "uuid"
+        assert caajs[0].trade_uuid != caajs[1].trade_uuid
+
+        caajs = rewards.flush()
+        assert [(caaj.amount, caaj.transaction_id) for caaj in caajs] == [("1", "0x4")]
+        rewards.add(251, self.get_caaj("2021-12-28 02:00:00", "0x1"), 10**18, 18)
+        assert rewards.flush()[0].trade_uuid == first_uuid
+        assert rewards.rewards == {}
+
+    def test_flush_wallets(self):
+        # wallets harvesting the same pool on the same day get rollups of
+        # their own
+        other = "0x0000000000000000000000000000000000000001"
+        rewards = RewardRollup()
+        rewards.add(251, self.get_caaj("2021-12-28 01:00:00", "0x1"), 10**18, 18)
+        rewards.add(
+            251, self.get_caaj("2021-12-28 02:00:00", "0x2", other), 10**18, 18
+        )
+        caajs = rewards.flush()
+        assert [(caaj.caaj_to, caaj.amount) for caaj in caajs] == [
+            ("0xDa28ecfc40181a6DAD8b52723035DFba3386d26E", "1"),
+            (other, "1"),
+        ]
+        assert caajs[0].trade_uuid != caajs[1].trade_uuid
+
+
+if __name__ == "__main__":
+    unittest.main()
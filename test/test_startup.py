@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# imported only by the runs that need them, never at startup
+DEFERRED_MODULES = [
+    "pandas",
+    "pyarrow",
+    "zstandard",
+    "eth_utils",
+    "requests",
+    "http.client",
+    "urllib.request",
+]
+# import time of src/main.py in microseconds, the interpreter's site
+# packages excluded. it is about 50ms on a developer machine, the budget
+# leaves room for slow CI machines
+STARTUP_BUDGET_US = 300000
+
+
+def get_import_times() -> dict:
+    # module -> cumulative microseconds of the imports done by main.py
+    pythonpath = os.pathsep.join(
+        path for path in ["src", os.environ.get("PYTHONPATH")] if path
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "src/main.py", "--help"],
+        capture_output=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": pythonpath},
+        text=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        import_times[name.strip()] = (int(cumulative), name.startswith("  "))
+    return import_times
+
+
+class TestStartup(unittest.TestCase):
+    def test_deferred_imports(self):
+        import_times = get_import_times()
+        assert "pancake_plugin.pancake_plugin" in import_times
+        for module in DEFERRED_MODULES:
+            assert module not in import_times, f"{module} is imported at startup"
+
+    def test_startup_budget(self):
+        total = sum(
+            cumulative
+            for name, (cumulative, nested) in get_import_times().items()
+            if not nested and name != "site"
+        )
+        assert total < STARTUP_BUDGET_US, f"startup imports take {total}us"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock, call, patch
+
+from pancake_plugin.token_table import MemoizedTokenTable, TokenTableSnapshot
+
+TOKEN_TABLE_CSV = """uti,chain,original_id,symbol
+bnb/bsc,bsc,0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c,bnb
+cake/bsc,bsc,0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82,cake
+eth/ethereum,bsc,0x2170Ed0880ac9A755fd29B2688956BD959F933F8,eth
+eth/ethereum,ethereum,0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2,eth
+"""
+
+
+class TokenTableHandler(BaseHTTPRequestHandler):
+    requests: list = []
+    status = 200
+
+    def do_GET(self):
+        TokenTableHandler.requests.append(self.headers.get("If-None-Match"))
+        if TokenTableHandler.status != 200:
+            self.send_error(TokenTableHandler.status)
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = TOKEN_TABLE_CSV.encode()
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTokenTable(unittest.TestCase):
+    def setUp(self):
+        TokenTableHandler.requests = []
+        TokenTableHandler.status = 200
+        self.server = HTTPServer(("127.0.0.1", 0), TokenTableHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/token_original_id.csv"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            snapshot = TokenTableSnapshot(self.url, tmpdir)
+            assert TokenTableHandler.requests == [None]
+            assert (
+                snapshot.get_uti("bsc", "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82")
+                == "cake/bsc"
+            )
+            assert (
+                snapshot.get_uti("bsc", "0x0e09fabb73bd3ade0a17ecc321fd13a19e81ce82")
+                == "cake/bsc"
+            )
+            assert (
+                snapshot.get_symbol("bsc", "0x2170Ed0880ac9A755fd29B2688956BD959F933F8")
+                == "eth"
+            )
+            assert snapshot.get_symbol("bsc", "0x0") is None
+            with self.assertRaises(ValueError):
+                snapshot.get_uti("bsc", "0x0")
+
+            # fresh snapshots load without any request
+            TokenTableSnapshot(self.url, tmpdir)
+            assert TokenTableHandler.requests == [None]
+
+            # stale snapshots are revalidated with their etag
+            os.utime(snapshot.path, (0, 0))
+            snapshot = TokenTableSnapshot(self.url, tmpdir)
+            assert TokenTableHandler.requests == [None, '"v1"']
+            assert snapshot.etag == '"v1"'
+            assert (
+                snapshot.get_uti("bsc", "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c")
+                == "bnb/bsc"
+            )
+
+    def test_snapshot_not_json(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = TokenTableSnapshot(self.url, tmpdir).path
+            assert path.endswith(".json")
+            # anything but a json snapshot is fetched again, never executed
+            with open(path, "wb") as file_snapshot:
+                file_snapshot.write(b"\x80\x04\x95cos\nsystem\n.")
+            snapshot = TokenTableSnapshot(self.url, tmpdir)
+            assert TokenTableHandler.requests == [None, None]
+            assert (
+                snapshot.get_uti("bsc", "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82")
+                == "cake/bsc"
+            )
+
+    def test_snapshot_offline(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            TokenTableSnapshot(self.url, tmpdir, max_age=0)
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            snapshot = TokenTableSnapshot(self.url, tmpdir, max_age=0, timeout=1)
+            assert (
+                snapshot.get_uti("bsc", "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82")
+                == "cake/bsc"
+            )
+
+    def test_snapshot_server_error(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            TokenTableHandler.status = 503
+            with self.assertRaises(urllib.error.HTTPError):
+                TokenTableSnapshot(self.url, tmpdir)
+            TokenTableHandler.status = 200
+            TokenTableSnapshot(self.url, tmpdir)
+            # a server error keeps working from the last snapshot
+            TokenTableHandler.status = 503
+            snapshot = TokenTableSnapshot(self.url, tmpdir, max_age=0)
+            assert len(TokenTableHandler.requests) == 3
+            assert (
+                snapshot.get_uti("bsc", "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82")
+                == "cake/bsc"
+            )
+
+    def test_memoized_token_table(self):
+        token_table = MagicMock()
+        token_table.get_uti.return_value = "cake/bsc"
+        memoized = MemoizedTokenTable(token_table)
+        for token_original_id in [
+            "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82",
+            "0x0e09fabb73bd3ade0a17ecc321fd13a19e81ce82",
+            "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82",
+        ]:
+            assert memoized.get_uti("bsc", token_original_id) == "cake/bsc"
+        # a case-sensitive table is memoized on the id exactly as it is asked
+        assert token_table.get_uti.call_args_list == [
+            call("bsc", "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82"),
+            call("bsc", "0x0e09fabb73bd3ade0a17ecc321fd13a19e81ce82"),
+        ]
+
+    def test_memoized_token_table_snapshot(self):
+        snapshot = TokenTableSnapshot.__new__(TokenTableSnapshot)
+        snapshot.index = TokenTableSnapshot.build_index(TOKEN_TABLE_CSV)
+        memoized = MemoizedTokenTable(snapshot)
+        with patch.object(snapshot, "get_uti", wraps=snapshot.get_uti) as get_uti:
+            for token_original_id in [
+                "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82",
+                "0x0e09fabb73bd3ade0a17ecc321fd13a19e81ce82",
+            ]:
+                assert memoized.get_uti("bsc", token_original_id) == "cake/bsc"
+            get_uti.assert_called_once_with(
+                "bsc", "0x0e09fabb73bd3ade0a17ecc321fd13a19e81ce82"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()